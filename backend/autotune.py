@@ -0,0 +1,342 @@
+"""
+Offline autotuner for chunking and retrieval settings.
+
+Sweeps the chunking settings of the ingestion strategy (parent_child: PARENT_CHUNK_SIZE,
+CHILD_CHUNK_SIZE, CHILD_CHUNK_OVERLAP; flat: CHUNK_SIZE, CHUNK_OVERLAP) together with
+RETRIEVAL_TOP_K, BM25_WEIGHT, MAX_REWRITES and CONTEXT_TOKEN_BUDGET over a corpus and a
+labelled question set, using the real ingestion splitters and the real rag_graph pipeline.
+Recall and context tokens are measured on the context generation actually receives, i.e.
+after child hits are expanded to their parent sections within the budget. Embeddings come
+from Ollama (cached across configurations); the grader/rewriter/generator LLM is replaced
+by a deterministic stub unless --llm ollama is given, and its cost is modelled instead.
+
+Corpus layout: files directly under --corpus are product-less; files under a
+numeric subdirectory (e.g. corpus/3/manual.pdf) are tagged with that product_id.
+
+Questions file (JSONL), one object per line:
+    {"question": "How do I reset the G9?", "evidence": ["hold the reset button"], "product_id": 3}
+A question's recall is the fraction of its evidence strings present in the final context.
+
+Usage:
+    python autotune.py --corpus ./eval/corpus --questions ./eval/questions.jsonl --output tune.json
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import RunnableLambda
+
+import docstore
+import rag_graph
+from chroma_utils import get_embedding_function
+from ingestion import CHUNK_STRATEGY, load_file, split_documents, split_parent_child
+from docstore import estimate_tokens, expand_to_parents
+from caches import clear_result_caches
+from residency import residency_manager
+from numpy_store import NumpyVectorStore
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "to", "of", "in", "on", "for", "and", "or",
+    "how", "what", "why", "when", "where", "which", "who", "do", "does", "did", "i", "my", "it",
+    "can", "with", "this", "that", "from", "by", "at", "as", "me", "you", "your",
+}
+
+def _terms(text: str) -> List[str]:
+    return [t for t in re.findall(r"\w+", text.lower()) if t not in STOPWORDS]
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+# --- STUB LLM ---
+class StubLLM:
+    """
+    Deterministic stand-in for the auxiliary LLM calls.
+    Grader: 'yes' when enough question terms appear in the document.
+    Rewriter: keeps only the content words of the question.
+    Everything else (contextualize, generate): a fixed string.
+    """
+
+    GRADER_RE = re.compile(r"retrieved document:\s*(.*?)\s*Here is the user question:\s*(.*?)\s*\n", re.S)
+    REWRITE_RE = re.compile(r"Question:\s*(.*?)\s*\n\s*Improved Question:", re.S)
+
+    def __init__(self, grade_overlap: float = 0.3):
+        self.grade_overlap = grade_overlap
+        self.calls: Dict[str, int] = {}
+
+    def _count(self, role: str):
+        self.calls[role] = self.calls.get(role, 0) + 1
+
+    def __call__(self, prompt_value) -> str:
+        text = prompt_value.to_string()
+        if "grader assessing relevance" in text:
+            self._count("grade")
+            match = self.GRADER_RE.search(text)
+            if not match:
+                return "no"
+            question_terms = set(_terms(match.group(2)))
+            doc_terms = set(_terms(match.group(1)))
+            if question_terms and len(question_terms & doc_terms) / len(question_terms) >= self.grade_overlap:
+                return "yes"
+            return "no"
+        if "question re-writer" in text:
+            self._count("rewrite")
+            match = self.REWRITE_RE.search(text)
+            return " ".join(_terms(match.group(1))) if match else text
+        self._count("other")
+        return "stub answer"
+
+    def runnable(self, role: str = "answer"):
+        return RunnableLambda(self)
+
+class CachedEmbeddings(Embeddings):
+    """Memoize embeddings by text so overlapping chunk configurations only embed new chunks."""
+
+    def __init__(self, inner: Embeddings):
+        self.inner = inner
+        self.cache: Dict[str, List[float]] = {}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        missing = [t for t in dict.fromkeys(texts) if t not in self.cache]
+        if missing:
+            for text, vector in zip(missing, self.inner.embed_documents(missing)):
+                self.cache[text] = vector
+        return [self.cache[t] for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = f"query:{text}"
+        if key not in self.cache:
+            self.cache[key] = self.inner.embed_query(text)
+        return self.cache[key]
+
+# --- CORPUS / QUESTIONS ---
+def load_corpus(corpus_dir: str):
+    """Parse every file once; returns a list of (documents, product_id)."""
+    corpus = []
+    for root, _, files in os.walk(corpus_dir):
+        rel = os.path.relpath(root, corpus_dir)
+        product_id = int(rel.split(os.sep)[0]) if rel != "." and rel.split(os.sep)[0].isdigit() else None
+        for filename in sorted(files):
+            if filename.startswith("."):
+                continue
+            print(f"---PARSING {os.path.join(rel, filename)}---")
+            corpus.append((load_file(os.path.join(root, filename), filename), filename, product_id))
+    return corpus
+
+def load_questions(path: str) -> List[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# Index settings swept per strategy (the rest are applied to rag_graph per evaluation)
+INDEX_KEYS = {
+    "flat": ("CHUNK_SIZE", "CHUNK_OVERLAP"),
+    "parent_child": ("PARENT_CHUNK_SIZE", "CHILD_CHUNK_SIZE", "CHILD_CHUNK_OVERLAP"),
+}
+RETRIEVAL_KEYS = ("RETRIEVAL_TOP_K", "BM25_WEIGHT", "MAX_REWRITES", "CONTEXT_TOKEN_BUDGET")
+
+def index_configs(args) -> List[dict]:
+    if args.strategy == "flat":
+        return [
+            {"CHUNK_SIZE": size, "CHUNK_OVERLAP": overlap}
+            for size, overlap in itertools.product(args.chunk_sizes, args.chunk_overlaps)
+            if overlap < size
+        ]
+    return [
+        {"PARENT_CHUNK_SIZE": parent, "CHILD_CHUNK_SIZE": child, "CHILD_CHUNK_OVERLAP": overlap}
+        for parent, child, overlap in itertools.product(args.parent_sizes, args.child_sizes, args.child_overlaps)
+        if child < parent and overlap < child
+    ]
+
+def build_index(corpus, index_config: dict, embeddings: Embeddings, path: str):
+    """Index the corpus with one chunking configuration; returns (store, chunk count, parents by id)."""
+    store = NumpyVectorStore(embedding_function=embeddings, path=path, quantization="float32")
+    total, parents_by_id = 0, {}
+    for docs, filename, product_id in corpus:
+        if "PARENT_CHUNK_SIZE" in index_config:
+            # Same id scheme as ingestion, keyed by path since there is no upload hash here
+            source_hash = hashlib.sha256(f"{product_id}/{filename}".encode()).hexdigest()
+            parents, chunks = split_parent_child(
+                docs, source_hash,
+                parent_chunk_size=index_config["PARENT_CHUNK_SIZE"],
+                child_chunk_size=index_config["CHILD_CHUNK_SIZE"],
+                child_chunk_overlap=index_config["CHILD_CHUNK_OVERLAP"],
+            )
+        else:
+            parents = []
+            chunks = split_documents(docs, chunk_size=index_config["CHUNK_SIZE"], chunk_overlap=index_config["CHUNK_OVERLAP"])
+        for chunk in parents + chunks:
+            chunk.metadata["source"] = filename
+            if product_id:
+                chunk.metadata["product_id"] = product_id
+        parents_by_id.update((parent.metadata["parent_id"], parent) for parent in parents)
+        if chunks:
+            store.add_documents(chunks)
+        total += len(chunks)
+    return store, total, parents_by_id
+
+# --- EVALUATION ---
+def evaluate(graph, questions: List[dict], stub: Optional[StubLLM], args) -> dict:
+    recalls, tokens, latencies, aux_calls = [], [], [], []
+    for item in questions:
+        if stub:
+            stub.calls.clear()
+        # Results cached under another configuration (or a previous question run) would skew the numbers
+        clear_result_caches()
+        t0 = time.perf_counter()
+        result = graph.invoke({
+            "question": item["question"],
+            "product_id": item.get("product_id"),
+            "chat_history": [],
+        })
+        measured_ms = (time.perf_counter() - t0) * 1000
+
+        # What generate() sends: child hits swapped for their parents within the token budget
+        context_docs = expand_to_parents(result.get("documents") or [], rag_graph.CONTEXT_TOKEN_BUDGET)
+        context = "\n\n".join(d.page_content for d in context_docs)
+        context_tokens = estimate_tokens(context)
+        evidence = item.get("evidence") or []
+        found = sum(1 for e in evidence if _normalize_text(e) in _normalize_text(context))
+        recalls.append(found / len(evidence) if evidence else 0.0)
+        tokens.append(context_tokens)
+
+        calls = (stub.calls.get("grade", 0) + stub.calls.get("rewrite", 0)) if stub else 0
+        aux_calls.append(calls)
+        # With the stub, add the modelled cost of the LLM work it replaced
+        modelled_ms = calls * args.llm_call_ms + context_tokens / 1000 * args.prefill_ms_per_1k if stub else 0
+        latencies.append(measured_ms + modelled_ms)
+
+    return {
+        "recall": round(statistics.mean(recalls), 4),
+        "context_tokens": round(statistics.mean(tokens), 1),
+        "latency_ms": round(statistics.mean(latencies), 1),
+        "aux_llm_calls": round(statistics.mean(aux_calls), 2),
+    }
+
+def pareto_front(results: List[dict]) -> List[dict]:
+    """Configs not dominated on (higher recall, fewer context tokens, lower latency)."""
+    def dominates(a, b):
+        better_or_equal = (
+            a["recall"] >= b["recall"]
+            and a["context_tokens"] <= b["context_tokens"]
+            and a["latency_ms"] <= b["latency_ms"]
+        )
+        strictly_better = (
+            a["recall"] > b["recall"]
+            or a["context_tokens"] < b["context_tokens"]
+            or a["latency_ms"] < b["latency_ms"]
+        )
+        return better_or_equal and strictly_better
+    return [r for r in results if not any(dominates(o, r) for o in results if o is not r)]
+
+def recommend(front: List[dict], recall_tolerance: float) -> dict:
+    """Cheapest Pareto config whose recall is within tolerance of the best."""
+    best_recall = max(r["recall"] for r in front)
+    eligible = [r for r in front if r["recall"] >= best_recall - recall_tolerance]
+    return min(eligible, key=lambda r: (r["latency_ms"], r["context_tokens"]))
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",")]
+
+def _float_list(value: str) -> List[float]:
+    return [float(v) for v in value.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", required=True)
+    parser.add_argument("--questions", required=True)
+    parser.add_argument("--strategy", choices=list(INDEX_KEYS), default=CHUNK_STRATEGY, help="Chunking strategy to tune (default: CHUNK_STRATEGY)")
+    parser.add_argument("--parent-sizes", type=_int_list, default=[800, 1200, 2000])
+    parser.add_argument("--child-sizes", type=_int_list, default=[200, 300, 400])
+    parser.add_argument("--child-overlaps", type=_int_list, default=[50])
+    parser.add_argument("--chunk-sizes", type=_int_list, default=[500, 1000, 1500], help="flat strategy only")
+    parser.add_argument("--chunk-overlaps", type=_int_list, default=[0, 100, 200], help="flat strategy only")
+    parser.add_argument("--top-ks", type=_int_list, default=[3, 5, 8])
+    parser.add_argument("--bm25-weights", type=_float_list, default=[0.3, 0.5, 0.7])
+    parser.add_argument("--max-rewrites", type=_int_list, default=[0, 1, 2])
+    parser.add_argument("--context-budgets", type=_int_list, default=[600, 1000, 1500])
+    parser.add_argument("--llm", choices=["stub", "ollama"], default="stub")
+    parser.add_argument("--llm-call-ms", type=float, default=800, help="Modelled cost of one grader/rewrite call (stub mode)")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=400, help="Modelled generate prefill cost per 1k context tokens (stub mode)")
+    parser.add_argument("--recall-tolerance", type=float, default=0.02)
+    parser.add_argument("--output", help="Write all results and the recommendation as JSON")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    corpus = load_corpus(args.corpus)
+    embeddings = CachedEmbeddings(get_embedding_function())
+
+    stub = None
+    if args.llm == "stub":
+        stub = StubLLM()
+        rag_graph.get_llm = stub.runnable
+    graph = rag_graph.build_graph()
+    # Resident products are loaded from the live index and docstore; every configuration here
+    # has its own temporary index, so BM25 is built from that index instead
+    rag_graph.RESIDENCY_ENABLED = False
+    residency_manager.invalidate()
+
+    results = []
+    index_keys = INDEX_KEYS[args.strategy]
+    parents_by_id: Dict[str, Document] = {}
+    # Parent sections of the configuration being evaluated, instead of the live docstore
+    docstore.get_parents = lambda parent_ids: {pid: parents_by_id[pid] for pid in parent_ids if pid in parents_by_id}
+    work_dir = tempfile.mkdtemp(prefix="autotune-")
+    try:
+        for index_config in index_configs(args):
+            t0 = time.perf_counter()
+            store, chunk_count, parents_by_id = build_index(
+                corpus, index_config, embeddings,
+                os.path.join(work_dir, "-".join(str(index_config[key]) for key in index_keys)),
+            )
+            print(f"---INDEXED {chunk_count} CHUNKS ({index_config}) IN {time.perf_counter() - t0:.1f}s---")
+            rag_graph.get_vector_store = lambda store=store: store
+
+            for top_k, bm25_weight, max_rewrites, budget in itertools.product(args.top_ks, args.bm25_weights, args.max_rewrites, args.context_budgets):
+                rag_graph.RETRIEVAL_TOP_K = top_k
+                rag_graph.BM25_WEIGHT = bm25_weight
+                rag_graph.MAX_REWRITES = max_rewrites
+                rag_graph.CONTEXT_TOKEN_BUDGET = budget
+                config = {
+                    **index_config,
+                    "RETRIEVAL_TOP_K": top_k,
+                    "BM25_WEIGHT": bm25_weight,
+                    "MAX_REWRITES": max_rewrites,
+                    "CONTEXT_TOKEN_BUDGET": budget,
+                }
+                metrics = evaluate(graph, questions, stub, args)
+                results.append({**config, "chunks": chunk_count, **metrics})
+                print(f"{config} -> {metrics}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    front = sorted(pareto_front(results), key=lambda r: -r["recall"])
+    best = recommend(front, args.recall_tolerance)
+
+    keys = index_keys + RETRIEVAL_KEYS
+    widths = {key: max(len(key) + 2, 8) for key in keys}
+    print("\n" + "".join(f"{key:>{widths[key]}}" for key in keys) + f"{'chunks':>8}{'recall':>8}{'tokens':>8}{'ms':>9}{'llm':>6}")
+    for r in front:
+        marker = "  <- recommended" if r is best else ""
+        print("".join(f"{r[key]:>{widths[key]}}" for key in keys)
+              + f"{r['chunks']:>8}{r['recall']:>8.3f}{r['context_tokens']:>8.0f}{r['latency_ms']:>9.0f}{r['aux_llm_calls']:>6.1f}{marker}")
+
+    print("\n# Recommended .env settings")
+    print(f"CHUNK_STRATEGY={args.strategy}")
+    for key in keys:
+        print(f"{key}={best[key]}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"strategy": args.strategy, "results": results, "pareto": front, "recommended": best}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark the model cascade: run the same questions through the full (graded) pipeline
+twice against the live index and Ollama. The first run puts every role on the answer
+model; the second uses the role models from the environment (LLM_<ROLE>_MODEL). It
+reports per-query latency, time per LLM node, rewrites, escalations and how often the
+grader kept the same documents.
+
+Questions are JSON lines: {"question": ..., "product_id": 1, "chat_history": [{"role": "user", "content": ...}]}
+(product_id and chat_history are optional; contextualize only runs with history).
+
+Usage:
+    LLM_GRADER_MODEL=llama3.2:1b LLM_REWRITER_MODEL=llama3.2:1b LLM_CONTEXTUALIZER_MODEL=llama3.2:1b \\
+        python bench_cascade.py --questions questions.jsonl [--escalation]
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.messages import AIMessage, HumanMessage
+
+import llm_roles
+import rag_graph
+from caches import clear_result_caches
+
+LLM_NODES = {"contextualize": "contextualizer", "grader": "grader", "rewrite": "rewriter", "generate": "answer"}
+
+def load_questions(path: str) -> List[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _inputs(item: dict) -> dict:
+    history = [
+        HumanMessage(content=m["content"]) if m["role"] == "user" else AIMessage(content=m["content"])
+        for m in item.get("chat_history", [])
+    ]
+    return {"question": item["question"], "product_id": item.get("product_id"), "chat_history": history, "mode": "full"}
+
+def configure(role_models: Dict[str, str], escalation: bool):
+    for role, model in role_models.items():
+        llm_roles.ROLE_CONFIG[role]["model"] = model
+    rag_graph.CASCADE_ESCALATION = escalation
+    rag_graph.get_llm.cache_clear()
+
+def run(graph, questions: List[dict], warmup: int) -> dict:
+    for item in questions[:warmup]:
+        # Loads the role models into Ollama so the first timed question doesn't pay for it
+        graph.invoke(_inputs(item))
+    escalations_before = sum(s["escalations"] for s in llm_roles.role_stats().values())
+
+    latencies, node_ms, rewrites, kept = [], {node: [] for node in LLM_NODES}, [], []
+    for item in questions:
+        clear_result_caches()
+        t0 = time.perf_counter()
+        result = graph.invoke(_inputs(item))
+        latencies.append((time.perf_counter() - t0) * 1000)
+        timings = result.get("timings") or {}
+        for node in LLM_NODES:
+            node_ms[node].append(timings.get(node, 0.0))
+        rewrites.append(result.get("rewrite_count", 0))
+        kept.append({doc.page_content for doc in result.get("documents") or []})
+    return {
+        "latencies": latencies,
+        "node_ms": {node: float(np.mean(values)) for node, values in node_ms.items()},
+        "rewrites": float(np.mean(rewrites)),
+        "escalations": sum(s["escalations"] for s in llm_roles.role_stats().values()) - escalations_before,
+        "kept": kept,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", required=True)
+    parser.add_argument("--escalation", action="store_true", help="Enable confidence-based escalation for the cascade run")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed questions per configuration")
+    parser.add_argument("--output", help="Write per-query latencies as JSON")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    cascade_models = {role: config["model"] for role, config in llm_roles.ROLE_CONFIG.items()}
+    answer_model = cascade_models["answer"]
+    graph = rag_graph.get_app_graph("rewrite")
+
+    configs = {
+        "single": ({role: answer_model for role in llm_roles.LLM_ROLES}, False),
+        "cascade": (cascade_models, args.escalation),
+    }
+    results = {}
+    for name, (models, escalation) in configs.items():
+        configure(models, escalation)
+        print(f"---{name.upper()}: {json.dumps(models)} (escalation={'on' if escalation else 'off'})---")
+        results[name] = run(graph, questions, args.warmup)
+
+    print(f"\n{len(questions)} questions\n")
+    header = f"{'config':<10}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}" + "".join(f"{node:>15}" for node in LLM_NODES) + f"{'rewrites':>10}{'escalated':>11}"
+    print(header)
+    for name, r in results.items():
+        p50, p95 = np.percentile(r["latencies"], [50, 95])
+        row = f"{name:<10}{p50:>9.0f}{p95:>9.0f}{np.mean(r['latencies']):>9.0f}"
+        row += "".join(f"{r['node_ms'][node]:>15.0f}" for node in LLM_NODES)
+        print(row + f"{r['rewrites']:>10.2f}{r['escalations']:>11}")
+
+    single, cascade = results["single"], results["cascade"]
+    saving = np.mean(single["latencies"]) - np.mean(cascade["latencies"])
+    agreement = np.mean([
+        len(a & b) / len(a | b) if a | b else 1.0 for a, b in zip(single["kept"], cascade["kept"])
+    ])
+    print(f"\nMean saving per query: {saving:.0f} ms ({100 * saving / np.mean(single['latencies']):.1f}%)")
+    print(f"Grader agreement (Jaccard of kept documents): {agreement:.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({name: {k: v for k, v in r.items() if k != "kept"} for name, r in results.items()}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark the vector backends (Chroma vs. the in-process NumPy store) on synthetic,
+clustered embeddings: recall@k against exact float32 search, query latency, cold-open
+time and peak RSS.
+
+Each backend is built and queried in its own subprocess so RSS numbers are not polluted
+by the other backends.
+
+Usage:
+    python bench_vector_store.py --vectors 50000 --dim 768 --products 4 --queries 200 --k 5
+"""
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+BACKENDS = ["chroma", "numpy-float32", "numpy-float16", "numpy-int8", "numpy-int8-ivf"]
+
+def make_dataset(n: int, dim: int, n_products: int, n_queries: int, seed: int = 0):
+    """Clustered unit vectors (manual sections look like clusters) plus noisy queries drawn near them."""
+    rng = np.random.default_rng(seed)
+    n_clusters = max(1, n // 200)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, n_clusters, n)] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    products = rng.integers(1, n_products + 1, n)
+    queries = vectors[rng.integers(0, n, n_queries)] + 0.3 * rng.normal(size=(n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    query_products = rng.integers(1, n_products + 1, n_queries)
+    return vectors, products, queries, query_products
+
+def exact_top_k(vectors, products, queries, query_products, k):
+    truth = []
+    for q, p in zip(queries, query_products):
+        rows = np.flatnonzero(products == p)
+        scores = vectors[rows] @ q
+        truth.append(set(rows[np.argsort(-scores)[:k]].tolist()))
+    return truth
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss survives fork+exec, so a spawned child would report the parent's peak; VmHWM does not
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _build(backend: str, path: str, vectors, products):
+    ids = [str(i) for i in range(len(vectors))]
+    metadatas = [{"product_id": int(p)} for p in products]
+    texts = [f"chunk {i}" for i in ids]
+    if backend == "chroma":
+        import chromadb
+        client = chromadb.PersistentClient(path=path)
+        collection = client.get_or_create_collection("bench", metadata={"hnsw:space": "cosine"})
+        batch = 5000
+        for i in range(0, len(ids), batch):
+            collection.add(ids=ids[i:i + batch], embeddings=vectors[i:i + batch].tolist(),
+                           metadatas=metadatas[i:i + batch], documents=texts[i:i + batch])
+    else:
+        import numpy_store
+        quantization = backend.split("-")[1]
+        numpy_store.NUMPY_IVF_MIN_VECTORS = 1 if backend.endswith("-ivf") else 0
+        store = numpy_store.NumpyVectorStore(embedding_function=None, path=path, quantization=quantization)
+        store.add_embeddings(texts, vectors, metadatas=metadatas, ids=ids)
+        store.compact()
+
+def _query(backend: str, path: str, queries, query_products, k: int, results):
+    start = time.perf_counter()
+    if backend == "chroma":
+        import chromadb
+        collection = chromadb.PersistentClient(path=path).get_collection("bench")
+        search = lambda q, p: collection.query(query_embeddings=[q.tolist()], n_results=k, where={"product_id": int(p)})["ids"][0]
+    else:
+        import numpy_store
+        store = numpy_store.NumpyVectorStore(embedding_function=None, path=path, quantization=backend.split("-")[1])
+        search = lambda q, p: [d.id for d, _ in store.similarity_search_by_vector_with_score(q, k=k, filter={"product_id": int(p)})]
+    # First query forces index/segment load
+    search(queries[0], query_products[0])
+    open_ms = (time.perf_counter() - start) * 1000
+
+    latencies, hits = [], []
+    for q, p in zip(queries, query_products):
+        t0 = time.perf_counter()
+        ids = search(q, p)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        hits.append({int(i) for i in ids})
+    results.put({"open_ms": open_ms, "latencies": latencies, "hits": hits, "rss_mb": _peak_rss_mb()})
+
+def run_backend(backend, data, k):
+    vectors, products, queries, query_products = data
+    path = tempfile.mkdtemp(prefix=f"bench-{backend}-")
+    ctx = mp.get_context("spawn")
+    try:
+        t0 = time.perf_counter()
+        builder = ctx.Process(target=_build, args=(backend, path, vectors, products))
+        builder.start()
+        builder.join()
+        build_s = time.perf_counter() - t0
+
+        results = ctx.Queue()
+        worker = ctx.Process(target=_query, args=(backend, path, queries, query_products, k, results))
+        worker.start()
+        result = results.get()
+        worker.join()
+        result["build_s"] = build_s
+        result["disk_mb"] = sum(
+            os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files
+        ) / 2**20
+        return result
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--products", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    args = parser.parse_args()
+
+    data = make_dataset(args.vectors, args.dim, args.products, args.queries)
+    truth = exact_top_k(*data, args.k)
+
+    print(f"{args.vectors} vectors x {args.dim} dims, {args.products} products, {args.queries} queries, k={args.k}\n")
+    print(f"{'backend':<16}{'recall@k':>10}{'p50 ms':>9}{'p95 ms':>9}{'open ms':>10}{'build s':>9}{'RSS MB':>9}{'disk MB':>9}")
+    for backend in args.backends.split(","):
+        r = run_backend(backend, data, args.k)
+        recall = np.mean([len(h & t) / len(t) for h, t in zip(r["hits"], truth) if t])
+        p50, p95 = np.percentile(r["latencies"], [50, 95])
+        print(f"{backend:<16}{recall:>10.3f}{p50:>9.2f}{p95:>9.2f}{r['open_ms']:>10.1f}{r['build_s']:>9.1f}{r['rss_mb']:>9.0f}{r['disk_mb']:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- CONFIG ---
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 5000))  # Query embeddings; never stale
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", 1000))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 500))
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", 3600))  # Retrieval/answer entries
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional TTL (0 = entries never expire)."""
+
+    def __init__(self, max_items: int, ttl_seconds: int = 0):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or (self.ttl_seconds and time.monotonic() - item[1] > self.ttl_seconds):
+                if item is not None:
+                    del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key: Hashable, value: Any):
+        if self.max_items <= 0:
+            return
+        with self._lock:
+            self._items[key] = (value, time.monotonic())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"items": len(self._items), "hits": self.hits, "misses": self.misses}
+
+embedding_cache = LRUCache(EMBEDDING_CACHE_SIZE)
+retrieval_cache = LRUCache(RETRIEVAL_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS)
+answer_cache = LRUCache(ANSWER_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS)
+
+def clear_result_caches():
+    """Drop retrieval and answer results; call whenever the indexed corpus changes."""
+    retrieval_cache.clear()
+    answer_cache.clear()
+
+def cache_stats() -> dict:
+    return {
+        "embedding": embedding_cache.stats(),
+        "retrieval": retrieval_cache.stats(),
+        "answer": answer_cache.stats(),
+    }
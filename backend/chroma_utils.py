@@ -1,25 +1,99 @@
 import os
-from langchain_chroma import Chroma
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Set, Tuple
 from langchain_ollama import OllamaEmbeddings
 from dotenv import load_dotenv
-import chromadb
+from caches import embedding_cache
+from profiling import stage
 
 load_dotenv()
 
 CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", "./data/chroma_db")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL_NAME", "nomic-embed-text")
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()  # chroma, numpy
 
 # Ensure directory exists
 os.makedirs(CHROMA_DB_PATH, exist_ok=True)
 
+class IndexLock:
+    """
+    Shared/exclusive lock around index writes. Each ingested file holds it shared from its first
+    vector write to its registration (files run in parallel with each other); snapshots and index
+    switches take it exclusive, which pauses ingestion between files instead of stopping it.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            while self._exclusive:
+                self._cond.wait()
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._shared -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            while self._exclusive:
+                self._cond.wait()
+            # Block new shared holders while the current ones drain
+            self._exclusive = True
+            while self._shared:
+                self._cond.wait()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
+
+index_lock = IndexLock()
+
+class CachedOllamaEmbeddings(OllamaEmbeddings):
+    """Ollama embeddings with an in-process cache for query vectors (documents are embedded once anyway)."""
+
+    def embed_documents(self, texts):
+        with stage("embed"):
+            return super().embed_documents(texts)
+
+    def embed_query(self, text: str):
+        key = (self.model, text)
+        vector = embedding_cache.get(key)
+        if vector is None:
+            vector = super().embed_query(text)
+            embedding_cache.set(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str):
+        key = (self.model, text)
+        vector = embedding_cache.get(key)
+        if vector is None:
+            vector = await super().aembed_query(text)
+            embedding_cache.set(key, vector)
+        return vector
+
 def get_embedding_function():
-    return OllamaEmbeddings(
+    return CachedOllamaEmbeddings(
         model=EMBEDDING_MODEL,
         base_url=OLLAMA_BASE_URL
     )
 
-def get_vector_store():
+def _get_chroma_store():
+    # Imported lazily: chromadb is slow to import and not needed by every backend
+    import chromadb
+    from langchain_chroma import Chroma
+
     # Persistent Client
     client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
     
@@ -31,3 +105,57 @@ def get_vector_store():
         embedding_function=embedding_function,
     )
     return vector_store
+
+def _get_numpy_store():
+    # Imported lazily so the Chroma-only setup doesn't pay for it
+    from numpy_store import NumpyVectorStore
+    return NumpyVectorStore(embedding_function=get_embedding_function())
+
+VECTOR_BACKENDS = {
+    "chroma": _get_chroma_store,
+    "numpy": _get_numpy_store,
+}
+
+def get_vector_store_path() -> str:
+    """On-disk location of the configured backend's index."""
+    if VECTOR_BACKEND == "numpy":
+        from numpy_store import NUMPY_STORE_PATH
+        return NUMPY_STORE_PATH
+    return CHROMA_DB_PATH
+
+def reset_vector_store_clients():
+    """Drop cached clients/segments so the next get_vector_store() reopens the files on disk."""
+    if VECTOR_BACKEND == "numpy":
+        import numpy_store
+        with numpy_store._segments_lock:
+            numpy_store._segments.clear()
+    else:
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
+
+def get_vector_store():
+    """Return the configured vector store (VECTOR_BACKEND env var)."""
+    try:
+        factory = VECTOR_BACKENDS[VECTOR_BACKEND]
+    except KeyError:
+        raise ValueError(f"Unknown VECTOR_BACKEND '{VECTOR_BACKEND}'. Expected one of: {', '.join(VECTOR_BACKENDS)}")
+    return factory()
+
+def delete_file_vectors(files: Iterable[Tuple[Optional[int], str]]):
+    """Remove every indexed chunk of the given (product_id, file_hash) files from the vector store."""
+    by_product: Dict[Optional[int], Set[str]] = {}
+    for product_id, file_hash in files:
+        by_product.setdefault(product_id, set()).add(file_hash)
+    if not by_product:
+        return
+    vector_store = get_vector_store()
+    with index_lock.shared():
+        for product_id, hashes in by_product.items():
+            if VECTOR_BACKEND == "numpy":
+                # Equality filters only: one pass over the product's segment instead of one per file
+                contents = vector_store.get(where={"product_id": product_id}, include=["metadatas"])
+                ids = [doc_id for doc_id, metadata in zip(contents["ids"], contents["metadatas"]) if metadata.get("file_hash") in hashes]
+            else:
+                ids = vector_store.get(where={"file_hash": {"$in": sorted(hashes)}}, include=[])["ids"]
+            if ids:
+                vector_store.delete(ids=ids)
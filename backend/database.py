@@ -1,7 +1,9 @@
 import os
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, JSON, ForeignKey
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, DateTime, Boolean, JSON, ForeignKey, LargeBinary, Index
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,6 +19,13 @@ engine = create_engine(
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async path (aiosqlite) for request handlers, so listing and bulk operations don't hold a
+# threadpool worker or the event loop. NullPool: every session opens its own short-lived
+# connection, so nothing needs disposing when a snapshot swaps the database file.
+ASYNC_SQLALCHEMY_DATABASE_URL = f"sqlite+aiosqlite:///{SQLITE_DB_PATH}"
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
 Base = declarative_base()
 
 # --- Product Model ---
@@ -42,21 +51,59 @@ class DocumentRegistry(Base):
     metadata_info = Column(JSON, default={})
     
     # Foreign key to Product
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=True, index=True)
     product = relationship("Product", back_populates="documents")
 
+    # Keyset pages filtered by status: WHERE product_id = ? AND status = ? AND id > ? ORDER BY id
+    __table_args__ = (Index("ix_document_registry_product_status", "product_id", "status"),)
+
+# --- Parent Chunk Docstore (small-to-big retrieval) ---
+class ParentChunk(Base):
+    __tablename__ = "parent_chunks"
+
+    id = Column(String, primary_key=True) # Referenced by child chunks' "parent_id" metadata
+    file_hash = Column(String, index=True)
+    product_id = Column(Integer, nullable=True, index=True)
+    content = Column(LargeBinary) # zlib-compressed UTF-8 text
+    metadata_info = Column(JSON, default={})
+
 class FeedbackLogs(Base):
     __tablename__ = "feedback_logs"
 
     id = Column(Integer, primary_key=True, index=True)
+    request_id = Column(String, unique=True, index=True) # Returned to the client for feedback
+    session_id = Column(String, nullable=True)
+    product_id = Column(Integer, nullable=True, index=True)
     query = Column(String)
+    standalone_query = Column(String, nullable=True)
     response = Column(String)
+    retrieved_ids = Column(JSON, default=[]) # Chunk ids used for the answer
+    latencies = Column(JSON, default={}) # Stage name -> milliseconds
     feedback = Column(String) # "up", "down"
-    timestamp = Column(DateTime, default=datetime.utcnow)
-    # Optional: link to document chunks used
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+
+def _upgrade_schema():
+    """
+    create_all() only creates missing tables. Add columns and indexes introduced since
+    an existing database was created (SQLite supports ADD COLUMN for nullable columns).
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    print(f"Database: added column {table.name}.{column.name}")
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _upgrade_schema()
     # No default products - admin will create them
 
 def get_db():
@@ -65,3 +112,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
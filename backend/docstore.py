@@ -0,0 +1,64 @@
+import zlib
+from typing import Dict, Iterable, List, Optional
+from langchain_core.documents import Document
+from sqlalchemy.orm import Session
+from database import SessionLocal, ParentChunk
+from residency import residency_manager
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text with Llama-family tokenizers
+    return len(text) // 4
+
+def add_parents(db: Session, parents: List[Document], file_hash: str, product_id: Optional[int] = None):
+    """Stage parent sections in the caller's transaction (committed with the document registration)."""
+    db.add_all([
+        ParentChunk(
+            id=parent.metadata["parent_id"],
+            file_hash=file_hash,
+            product_id=product_id,
+            content=zlib.compress(parent.page_content.encode("utf-8")),
+            metadata_info=parent.metadata,
+        )
+        for parent in parents
+    ])
+
+def get_parents(parent_ids: Iterable[str]) -> Dict[str, Document]:
+    parent_ids = list(set(parent_ids))
+    if not parent_ids:
+        return {}
+    found = residency_manager.parents(parent_ids)
+    missing = [parent_id for parent_id in parent_ids if parent_id not in found]
+    if not missing:
+        return found
+    db = SessionLocal()
+    try:
+        rows = db.query(ParentChunk).filter(ParentChunk.id.in_(missing)).all()
+        found.update({
+            row.id: Document(page_content=zlib.decompress(row.content).decode("utf-8"), metadata=row.metadata_info or {})
+            for row in rows
+        })
+        return found
+    finally:
+        db.close()
+
+def expand_to_parents(documents: List[Document], token_budget: int) -> List[Document]:
+    """
+    Replace child hits with their parent sections, in rank order, deduplicated, until the
+    token budget is spent. Chunks without a parent (flat index) are kept as they are.
+    The first document is always included even if it alone exceeds the budget.
+    """
+    parents = get_parents(d.metadata["parent_id"] for d in documents if d.metadata.get("parent_id"))
+    expanded, seen, used = [], set(), 0
+    for doc in documents:
+        parent_id = doc.metadata.get("parent_id")
+        key = parent_id or doc.page_content
+        if key in seen:
+            continue
+        candidate = parents.get(parent_id, doc) if parent_id else doc
+        tokens = estimate_tokens(candidate.page_content)
+        if expanded and used + tokens > token_budget:
+            continue
+        seen.add(key)
+        expanded.append(candidate)
+        used += tokens
+    return expanded
@@ -1,14 +1,23 @@
+import asyncio
+import contextvars
 import hashlib
 import os
-import shutil
+import tarfile
+import tempfile
+import zipfile
 import gc
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, List, Optional, Tuple
 from fastapi import UploadFile, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from langchain_community.document_loaders import UnstructuredFileLoader, PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from database import DocumentRegistry
-from chroma_utils import get_vector_store
+from database import DocumentRegistry, SessionLocal
+from chroma_utils import get_vector_store, index_lock
+from caches import clear_result_caches
+from residency import residency_manager
+from profiling import stage
+from docstore import add_parents
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -19,93 +28,352 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1000))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 200))
 
-def calculate_file_hash(file_path: str) -> str:
+# "flat": embed CHUNK_SIZE chunks; "parent_child": embed small child chunks, keep parent sections in the docstore
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "parent_child").lower()
+# Parents are what the LLM reads: at 1200 chars (~300 tokens) three fit in the default context
+# budget, against five 1000-char flat chunks before. Tune with autotune.py
+PARENT_CHUNK_SIZE = int(os.getenv("PARENT_CHUNK_SIZE", 1200))
+CHILD_CHUNK_SIZE = int(os.getenv("CHILD_CHUNK_SIZE", 300))
+CHILD_CHUNK_OVERLAP = int(os.getenv("CHILD_CHUNK_OVERLAP", 50))
+
+# Read/write buffer for streaming uploads (hash + write in one pass)
+UPLOAD_BUFFER_SIZE = int(os.getenv("UPLOAD_BUFFER_SIZE", 1024 * 1024))
+# Number of files ingested concurrently by the bulk endpoint
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+# Limits on what one archive may expand to (zip bombs, runaway tarballs)
+ARCHIVE_MAX_MEMBERS = int(os.getenv("ARCHIVE_MAX_MEMBERS", 1000))
+ARCHIVE_MAX_MEMBER_MB = int(os.getenv("ARCHIVE_MAX_MEMBER_MB", 200))
+ARCHIVE_MAX_TOTAL_MB = int(os.getenv("ARCHIVE_MAX_TOTAL_MB", 2048))
+
+class ArchiveLimitExceeded(Exception):
+    """An archive member would decompress past a configured limit."""
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def _new_temp_file(filename: str):
+    """Open a uniquely named temp file in UPLOAD_DIR so concurrent uploads never collide."""
+    ext = os.path.splitext(filename)[1].lower()
+    fd, temp_path = tempfile.mkstemp(prefix=".upload-", suffix=ext, dir=UPLOAD_DIR)
+    return os.fdopen(fd, "wb"), temp_path
+
+async def save_upload(file: UploadFile) -> Tuple[str, str]:
+    """
+    Stream an upload to a unique temp file, hashing it in the same pass.
+    Returns (temp_path, sha256 hex digest).
+    """
     sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        # Read and update hash string value in blocks of 4K
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-    return sha256_hash.hexdigest()
+    buffer, temp_path = _new_temp_file(file.filename)
+    try:
+        with buffer:
+            while True:
+                block = await file.read(UPLOAD_BUFFER_SIZE)
+                if not block:
+                    break
+                sha256_hash.update(block)
+                buffer.write(block)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path, sha256_hash.hexdigest()
 
-async def process_upload(file: UploadFile, db: Session, product_id: Optional[int] = None):
-    # 1. Save file temporarily
-    temp_file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(temp_file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # 2. Calculate Hash
-    file_hash = calculate_file_hash(temp_file_path)
-    
-    # 3. Check Duplicate in DB
-    existing_doc = db.query(DocumentRegistry).filter(DocumentRegistry.file_hash == file_hash).first()
-    if existing_doc:
-        os.remove(temp_file_path) # Clean up
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail=f"Duplicate Content Detected. File hash {file_hash} already exists."
-        )
+def save_stream(source: BinaryIO, filename: str, max_bytes: Optional[int] = None) -> Tuple[str, str]:
+    """
+    Synchronous counterpart of save_upload, used for archive members.
+    Raises ArchiveLimitExceeded (leaving no temp file) once more than max_bytes have been read.
+    """
+    sha256_hash = hashlib.sha256()
+    buffer, temp_path = _new_temp_file(filename)
+    written = 0
+    try:
+        with buffer:
+            for block in iter(lambda: source.read(UPLOAD_BUFFER_SIZE), b""):
+                written += len(block)
+                if max_bytes is not None and written > max_bytes:
+                    raise ArchiveLimitExceeded()
+                sha256_hash.update(block)
+                buffer.write(block)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path, sha256_hash.hexdigest()
+
+def _skip_archive_member(name: str) -> bool:
+    basename = os.path.basename(name)
+    return (
+        not basename
+        or basename.startswith(".")
+        or "__MACOSX" in name
+        or is_archive(basename)  # No nested archives
+    )
+
+def _archive_entries(archive_path: str, archive_name: str):
+    """Yield (filename, declared size, open) for every regular file of a zip/tar archive, in archive order."""
+    if archive_name.lower().endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and not _skip_archive_member(info.filename):
+                    yield os.path.basename(info.filename), info.file_size, lambda info=info: zf.open(info)
+    else:
+        with tarfile.open(archive_path, "r:*") as tf:
+            for member in tf:
+                if member.isfile() and not _skip_archive_member(member.name):
+                    yield os.path.basename(member.name), member.size, lambda member=member: tf.extractfile(member)
+
+def extract_archive(archive_path: str, archive_name: str) -> Tuple[List[Tuple[str, str, str]], List[dict]]:
+    """
+    Stream every regular file of a zip/tar archive into its own temp file.
+    Members are never written to their archived paths, so traversal entries are harmless.
+    Extraction stops at ARCHIVE_MAX_MEMBERS files; a member that would decompress past
+    ARCHIVE_MAX_MEMBER_MB or the archive's ARCHIVE_MAX_TOTAL_MB is skipped, even if its
+    header understates its size.
+    Returns (members, failed): members as (temp_path, filename, file_hash), plus a "failed" result per skipped member.
+    """
+    members, failed = [], []
+    member_limit = ARCHIVE_MAX_MEMBER_MB * 2**20
+    total_left = ARCHIVE_MAX_TOTAL_MB * 2**20
+    try:
+        for count, (filename, size, open_member) in enumerate(_archive_entries(archive_path, archive_name)):
+            if count >= ARCHIVE_MAX_MEMBERS:
+                failed.append({"status": "failed", "filename": archive_name, "detail": f"More than {ARCHIVE_MAX_MEMBERS} files; the rest were not extracted"})
+                break
+            max_bytes = min(member_limit, total_left)
+            try:
+                if size > max_bytes:
+                    raise ArchiveLimitExceeded()
+                with open_member() as source:
+                    temp_path, file_hash = save_stream(source, filename, max_bytes=max_bytes)
+            except ArchiveLimitExceeded:
+                if max_bytes == member_limit:
+                    detail = f"Larger than {ARCHIVE_MAX_MEMBER_MB} MB when extracted"
+                else:
+                    detail = f"Archive exceeds {ARCHIVE_MAX_TOTAL_MB} MB when extracted"
+                failed.append({"status": "failed", "filename": filename, "detail": detail})
+                continue
+            total_left -= os.path.getsize(temp_path)
+            members.append((temp_path, filename, file_hash))
+    except Exception:
+        for temp_path, _, _ in members:
+            os.remove(temp_path)
+        raise
+    return members, failed
+
+def find_duplicate(db: Session, file_hash: str) -> Optional[DocumentRegistry]:
+    return db.query(DocumentRegistry).filter(DocumentRegistry.file_hash == file_hash).first()
+
+def load_file(path: str, filename: str):
+    """Parse a file into LangChain documents, picking the loader by extension."""
+    # Loaders pull in unstructured/pypdf, so only import them once we actually ingest
+    from langchain_community.document_loaders import UnstructuredFileLoader, PyPDFLoader
     
-    # 4. Ingest (Parse & Chunk)
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".pdf":
+        loader = PyPDFLoader(path)
+    else:
+        loader = UnstructuredFileLoader(path)
+    return loader.load()
+
+def split_documents(docs, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    return text_splitter.split_documents(docs)
+
+def split_parent_child(docs, file_hash: str, parent_chunk_size: int = PARENT_CHUNK_SIZE, child_chunk_size: int = CHILD_CHUNK_SIZE, child_chunk_overlap: int = CHILD_CHUNK_OVERLAP):
+    """
+    Split into non-overlapping parent sections, then each parent into small child chunks.
+    Children carry their parent's id in metadata; returns (parents, children).
+    """
+    parents = split_documents(docs, chunk_size=parent_chunk_size, chunk_overlap=0)
+    children = []
+    for i, parent in enumerate(parents):
+        parent.metadata["parent_id"] = f"{file_hash[:16]}-{i}"
+        for child in split_documents([parent], chunk_size=child_chunk_size, chunk_overlap=child_chunk_overlap):
+            children.append(child)
+    return parents, children
+
+def ingest_file(temp_path: str, filename: str, file_hash: str, db: Session, product_id: Optional[int] = None):
+    """
+    Parse, chunk, index and register a file that has already been saved and hashed.
+    The temp file is moved to its permanent, hash-keyed location on success and removed on failure.
+    """
+    ext = os.path.splitext(filename)[1].lower()
     try:
-        # Check extension
-        ext = os.path.splitext(file.filename)[1].lower()
-        if ext == ".pdf":
-            loader = PyPDFLoader(temp_file_path)
-        else:
-            loader = UnstructuredFileLoader(temp_file_path)
-            
-        docs = loader.load()
-        
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP
-        )
-        chunks = text_splitter.split_documents(docs)
+        with stage("parse"):
+            docs = load_file(temp_path, filename)
+        parents = []
+        with stage("split"):
+            if CHUNK_STRATEGY == "parent_child":
+                parents, chunks = split_parent_child(docs, file_hash)
+            else:
+                chunks = split_documents(docs)
         
         # Add metadata
-        for chunk in chunks:
-            chunk.metadata["source"] = file.filename
+        for chunk in parents + chunks:
+            chunk.metadata["source"] = filename
             chunk.metadata["file_hash"] = file_hash
             if product_id:
                 chunk.metadata["product_id"] = product_id
             
-        # 5. Index to ChromaDB
-        vector_store = get_vector_store()
-        
-        # Process in SMALLER batches to avoid OOM with large files
-        BATCH_SIZE = 20  # Reduced from 50 for memory safety
-        total_chunks = len(chunks)
-        total_batches = (total_chunks + BATCH_SIZE - 1) // BATCH_SIZE
-        
-        print(f"--- Started Indexing {total_chunks} chunks ({total_batches} batches) for {file.filename} ---")
-        
-        for i in range(0, total_chunks, BATCH_SIZE):
-            batch = chunks[i : i + BATCH_SIZE]
-            batch_num = i // BATCH_SIZE + 1
-            print(f"[{batch_num}/{total_batches}] Indexing {len(batch)} chunks...")
-            vector_store.add_documents(batch)
+        # Shared lock held from the first vector write to the registration commit: a snapshot or
+        # activation waits for the whole file, so it never sees vectors without their registry row
+        # and never moves the index or database away between our batches
+        with index_lock.shared():
+            # Drop the connection opened before the lock (an activation may have swapped the
+            # database file since) and re-check duplicates against the current database
+            db.rollback()
+            if find_duplicate(db, file_hash):
+                os.remove(temp_path)
+                return {"status": "duplicate", "filename": filename, "file_hash": file_hash}
+
+            # Index to ChromaDB
+            vector_store = get_vector_store()
+            
+            # Process in SMALLER batches to avoid OOM with large files
+            BATCH_SIZE = 20  # Reduced from 50 for memory safety
+            total_chunks = len(chunks)
+            total_batches = (total_chunks + BATCH_SIZE - 1) // BATCH_SIZE
             
-            # Force garbage collection to free memory between batches
-            gc.collect()
+            print(f"--- Started Indexing {total_chunks} chunks ({total_batches} batches) for {filename} ---")
             
-        print("--- Indexing Complete ---")
+            for i in range(0, total_chunks, BATCH_SIZE):
+                batch = chunks[i : i + BATCH_SIZE]
+                batch_num = i // BATCH_SIZE + 1
+                print(f"[{batch_num}/{total_batches}] Indexing {len(batch)} chunks...")
+                with stage("vector_write"):
+                    vector_store.add_documents(batch)
+                
+                # Force garbage collection to free memory between batches
+                gc.collect()
+                
+            print(f"--- Indexing Complete: {filename} ---")
+            
+            # Register in DB
+            new_doc = DocumentRegistry(
+                filename=filename,
+                file_hash=file_hash,
+                status="processed",
+                metadata_info={"chunk_count": len(chunks), "parent_count": len(parents)},
+                product_id=product_id  # Associate with product
+            )
+            db.add(new_doc)
+            if parents:
+                add_parents(db, parents, file_hash, product_id=product_id)
+            with stage("register"):
+                db.commit()
+            db.refresh(new_doc)
+
+        if hasattr(vector_store, "schedule_compaction"):
+            # Each batch became a part of the product's segment; merge them off the request path
+            vector_store.schedule_compaction(product_id, guard=index_lock.shared)
         
-        # 6. Register in DB
-        new_doc = DocumentRegistry(
-            filename=file.filename,
-            file_hash=file_hash,
-            status="processed",
-            metadata_info={"chunk_count": len(chunks)},
-            product_id=product_id  # Associate with product
+        # Cached retrievals/answers and the resident copy no longer reflect the corpus
+        clear_result_caches()
+        residency_manager.invalidate(product_id)
+    except Exception:
+        db.rollback()
+        os.remove(temp_path)
+        raise
+    
+    # Keep the original under a content-addressed name
+    os.replace(temp_path, os.path.join(UPLOAD_DIR, f"{file_hash}{ext}"))
+    return {"status": "success", "filename": filename, "chunks": len(chunks), "product_id": product_id}
+
+async def process_upload(file: UploadFile, db: Session, product_id: Optional[int] = None):
+    # 1. Stream to a unique temp file, hashing on the fly
+    temp_file_path, file_hash = await save_upload(file)
+    
+    # 2. Check Duplicate in DB (before any parsing)
+    if await run_in_threadpool(find_duplicate, db, file_hash):
+        os.remove(temp_file_path) # Clean up
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Duplicate Content Detected. File hash {file_hash} already exists."
         )
-        db.add(new_doc)
-        db.commit()
-        db.refresh(new_doc)
-        
-        return {"status": "success", "filename": file.filename, "chunks": len(chunks), "product_id": product_id}
-        
+    
+    # 3. Ingest (Parse, Chunk, Index, Register) in a worker thread, off the event loop
+    try:
+        result = await run_in_threadpool(ingest_file, temp_file_path, file.filename, file_hash, db, product_id=product_id)
     except Exception as e:
-        db.rollback()
-        # Clean up if needed, though we might want to keep failed files for debugging
         raise HTTPException(status_code=500, detail=str(e))
+    if result["status"] == "duplicate":
+        # Registered by a concurrent upload or present in a snapshot activated meanwhile
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Duplicate Content Detected. File hash {file_hash} already exists."
+        )
+    return result
 
+def _ingest_in_session(temp_path: str, filename: str, file_hash: str, product_id: Optional[int]):
+    """Worker entry point for bulk ingestion - each thread gets its own DB session."""
+    db = SessionLocal()
+    try:
+        return ingest_file(temp_path, filename, file_hash, db, product_id=product_id)
+    except Exception as e:
+        print(f"--- Ingestion Failed: {filename}: {e} ---")
+        return {"status": "failed", "filename": filename, "detail": str(e)}
+    finally:
+        db.close()
+
+async def process_bulk_upload(files: List[UploadFile], db: Session, product_id: Optional[int] = None):
+    """
+    Ingest many files (or zip/tar archives of manuals) in one request.
+    Duplicates are rejected right after hashing; the rest are ingested in parallel.
+    Returns one result entry per file instead of failing the whole batch.
+    """
+    results = []
+    pending = []  # (temp_path, filename, file_hash)
+    members = []
+    seen_hashes = set()
+    
+    try:
+        for file in files:
+            if is_archive(file.filename):
+                archive_path, _ = await save_upload(file)
+                try:
+                    # Decompression is CPU and disk bound: keep it off the event loop
+                    members, failed = await run_in_threadpool(extract_archive, archive_path, file.filename)
+                except (zipfile.BadZipFile, tarfile.TarError) as e:
+                    members = []
+                    results.append({"status": "failed", "filename": file.filename, "detail": f"Unreadable archive: {e}"})
+                    continue
+                finally:
+                    os.remove(archive_path)
+                results.extend(failed)
+            else:
+                temp_path, file_hash = await save_upload(file)
+                members = [(temp_path, file.filename, file_hash)]
+            
+            for temp_path, filename, file_hash in members:
+                if file_hash in seen_hashes or await run_in_threadpool(find_duplicate, db, file_hash):
+                    os.remove(temp_path)
+                    results.append({"status": "duplicate", "filename": filename, "file_hash": file_hash})
+                    continue
+                seen_hashes.add(file_hash)
+                pending.append((temp_path, filename, file_hash))
+    except BaseException:
+        # The request fails as a whole: drop every temp file staged so far
+        for temp_path, _, _ in pending + members:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        raise
+    
+    print(f"--- Bulk Upload: {len(pending)} files to ingest, {len(results)} skipped ---")
+    
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=INGEST_WORKERS) as pool:
+        futures = [
+            # Each worker runs in a copy of the request context so an active profile follows it
+            loop.run_in_executor(pool, contextvars.copy_context().run, _ingest_in_session, temp_path, filename, file_hash, product_id)
+            for temp_path, filename, file_hash in pending
+        ]
+        results.extend(await asyncio.gather(*futures))
+    
+    return {
+        "product_id": product_id,
+        "succeeded": sum(1 for r in results if r["status"] == "success"),
+        "results": results,
+    }
@@ -0,0 +1,64 @@
+import os
+import threading
+from collections import Counter
+from typing import Dict, List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- CONFIG ---
+# Each LLM call in the graph has a role; every role can point at its own Ollama model.
+#   answer          final generation (and conversation summaries)
+#   grader          yes/no relevance grading, called once per retrieved chunk
+#   rewriter        query rewrites and multi-query variants
+#   contextualizer  standalone-question reformulation for follow-ups
+# Per role: LLM_<ROLE>_MODEL, LLM_<ROLE>_KEEP_ALIVE and LLM_<ROLE>_CONCURRENCY (0 = unlimited).
+LLM_MODEL = os.getenv("LLM_MODEL_NAME", "llama3.1")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "5m")
+LLM_ROLES = ("answer", "grader", "rewriter", "contextualizer")
+
+# Re-ask the answer model when a smaller role model gives an answer that doesn't fit the expected shape
+CASCADE_ESCALATION = os.getenv("CASCADE_ESCALATION", "False").lower() == "true"
+
+def _role_config(role: str) -> dict:
+    prefix = f"LLM_{role.upper()}"
+    return {
+        "model": os.getenv(f"{prefix}_MODEL", LLM_MODEL),
+        "keep_alive": os.getenv(f"{prefix}_KEEP_ALIVE", OLLAMA_KEEP_ALIVE),
+        "concurrency": int(os.getenv(f"{prefix}_CONCURRENCY", 0)),
+    }
+
+ROLE_CONFIG: Dict[str, dict] = {role: _role_config(role) for role in LLM_ROLES}
+
+def role_models() -> List[str]:
+    """Distinct models used by the roles, answer model first."""
+    models = []
+    for role in LLM_ROLES:
+        if ROLE_CONFIG[role]["model"] not in models:
+            models.append(ROLE_CONFIG[role]["model"])
+    return models
+
+def keep_alive_for(model: str) -> str:
+    # Ollama keeps the keep_alive of the latest request per model, so roles sharing a model share it
+    for role in LLM_ROLES:
+        if ROLE_CONFIG[role]["model"] == model:
+            return ROLE_CONFIG[role]["keep_alive"]
+    return OLLAMA_KEEP_ALIVE
+
+# --- STATS ---
+_stats_lock = threading.Lock()
+_calls: Counter = Counter()
+_escalations: Counter = Counter()
+
+def record_call(role: str, escalated: bool = False):
+    with _stats_lock:
+        _calls[role] += 1
+        if escalated:
+            _escalations[role] += 1
+
+def role_stats() -> dict:
+    with _stats_lock:
+        return {
+            role: {**ROLE_CONFIG[role], "calls": _calls[role], "escalations": _escalations[role]}
+            for role in LLM_ROLES
+        }
@@ -1,9 +1,16 @@
+import time
+PROCESS_START = time.perf_counter()
+
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
 from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
 from database import init_db, Product, DocumentRegistry
+from warmup import WARMUP_ON_STARTUP, warm_up, stop_warm_up, mark_ready, readiness
+from query_log import query_logger
 
 load_dotenv()
 
@@ -35,23 +42,55 @@ app.add_middleware(
 )
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     init_db()
     print("Database initialized.")
+    
+    # Heavy imports, model loads and index opening happen in the background;
+    # /ready reports when they are done
+    if WARMUP_ON_STARTUP:
+        asyncio.create_task(warm_up(PROCESS_START, IMPORT_SECONDS))
+    else:
+        mark_ready()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_warm_up()
+    # Flush queued query log entries
+    query_logger.stop()
 
 @app.get("/")
 def health_check():
     return {"status": "running", "project": "Tele-Cortex Local"}
 
+@app.get("/ready")
+def readiness_check():
+    """Readiness probe: 200 once models are loaded and the vector index is open, 503 before that"""
+    state = readiness()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
 # Import after app creation to avoid circular imports if any, keeping it simple here
 from sqlalchemy.orm import Session
-from fastapi import UploadFile, File, Depends, HTTPException
-from database import get_db
-from ingestion import process_upload
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import UploadFile, File, Depends, HTTPException, BackgroundTasks, Header, Query
+from database import get_db, get_async_db
+import registry
+from residency import residency_manager
+import profiling
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 
 # ============ PRODUCT ENDPOINTS ============
+from fastapi.concurrency import run_in_threadpool
+from caches import clear_result_caches
+
+async def _purge_deleted_files(files):
+    """After a committed delete: drop the files' chunks from the index, then anything resident or cached that still holds them."""
+    from chroma_utils import delete_file_vectors
+    await run_in_threadpool(delete_file_vectors, files)
+    for product_id in {product_id for product_id, _ in files}:
+        residency_manager.invalidate(product_id)
+    clear_result_caches()
 
 class ProductCreate(BaseModel):
     name: str
@@ -61,10 +100,13 @@ class ProductResponse(BaseModel):
     name: str
 
 @app.get("/products")
-def list_products(db: Session = Depends(get_db)):
-    """Get all products"""
-    products = db.query(Product).all()
-    return [{"id": p.id, "name": p.name} for p in products]
+async def list_products(
+    limit: int = Query(registry.PAGE_SIZE, ge=1, le=registry.MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Products page by page (pass next_cursor back as `after`), with per-product document counts"""
+    return await registry.list_products(db, limit=limit, after=after)
 
 @app.post("/products")
 def create_product(product: ProductCreate, db: Session = Depends(get_db)):
@@ -81,68 +123,246 @@ def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     return {"id": new_product.id, "name": new_product.name}
 
 @app.delete("/products/{product_id}")
-def delete_product(product_id: int, db: Session = Depends(get_db)):
+async def delete_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete a product and all its documents"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    db.delete(product)  # Cascade deletes documents due to relationship
-    db.commit()
-    return {"message": f"Product '{product.name}' deleted"}
+    # Set-based deletes instead of cascading row by row through the relationship
+    files = await registry.selected_files(db, product_id=product_id)
+    deleted = await registry.delete_product(db, product_id)
+    await db.commit()
+    await _purge_deleted_files(files)
+    return {"message": f"Product '{product.name}' deleted", "documents_deleted": deleted}
 
 # ============ DOCUMENT ENDPOINTS ============
 
 @app.get("/products/{product_id}/documents")
-def list_product_documents(product_id: int, db: Session = Depends(get_db)):
-    """Get all documents for a specific product"""
+async def list_product_documents(
+    product_id: int,
+    limit: int = Query(registry.PAGE_SIZE, ge=1, le=registry.MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    status: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """A product's documents page by page (pass next_cursor back as `after`), optionally filtered by status"""
+    if not await db.get(Product, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    return await registry.list_documents(db, product_id, limit=limit, after=after, status=status)
+
+@app.post("/products/{product_id}/warm")
+def warm_product(product_id: int, db: Session = Depends(get_db)):
+    """Load a product's retrieval index into memory; the frontend calls this when a device is selected"""
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    
-    documents = db.query(DocumentRegistry).filter(DocumentRegistry.product_id == product_id).all()
-    return [
-        {
-            "id": d.id,
-            "filename": d.filename,
-            "upload_date": d.upload_date.isoformat() if d.upload_date else None,
-            "status": d.status
-        }
-        for d in documents
-    ]
+    return residency_manager.warm(product_id).to_dict()
 
 @app.post("/products/{product_id}/upload")
-async def upload_to_product(product_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_to_product(product_id: int, file: UploadFile = File(...), db: Session = Depends(get_db), x_profile: Optional[str] = Header(None)):
     """Upload a document to a specific product"""
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    return await process_upload(file, db, product_id=product_id)
+    from ingestion import process_upload
+    profile = profiling.start_profile("upload", file.filename, x_profile)
+    with profiling.activate(profile):
+        result = await process_upload(file, db, product_id=product_id)
+    if profile:
+        result["profile_id"] = profile.id
+    # Re-ingestion cleared the caches; refill them with this product's frequent questions
+    # once the uploads to it settle
+    schedule_prewarm(product_id)
+    return result
+
+@app.post("/products/{product_id}/upload/bulk")
+async def bulk_upload_to_product(product_id: int, files: List[UploadFile] = File(...), db: Session = Depends(get_db), x_profile: Optional[str] = Header(None)):
+    """Upload many documents (or zip/tar archives of manuals) to a product, with per-file results"""
+    product = db.query(Product).filter(Product.id == product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    from ingestion import process_bulk_upload
+    profile = profiling.start_profile("bulk_upload", f"{len(files)} files", x_profile)
+    with profiling.activate(profile):
+        result = await process_bulk_upload(files, db, product_id=product_id)
+    if profile:
+        result["profile_id"] = profile.id
+    if result["succeeded"]:
+        schedule_prewarm(product_id)
+    return result
 
 @app.delete("/documents/{document_id}")
-def delete_document(document_id: int, db: Session = Depends(get_db)):
+async def delete_document(document_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete a specific document"""
-    doc = db.query(DocumentRegistry).filter(DocumentRegistry.id == document_id).first()
+    doc = await db.get(DocumentRegistry, document_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    db.delete(doc)
-    db.commit()
+    files = await registry.selected_files(db, ids=[document_id])
+    await registry.delete_documents(db, ids=[document_id])
+    await db.commit()
+    await _purge_deleted_files(files)
     return {"message": f"Document '{doc.filename}' deleted"}
 
+class DocumentSelection(BaseModel):
+    # Filters are combined; at least one is required
+    ids: Optional[List[int]] = None
+    product_id: Optional[int] = None
+    status: Optional[str] = None
+
+class DocumentStatusUpdate(DocumentSelection):
+    new_status: str
+
+@app.post("/documents/bulk-delete")
+async def bulk_delete_documents(selection: DocumentSelection, db: AsyncSession = Depends(get_async_db)):
+    """Delete every document matching the selection in one statement per table"""
+    try:
+        files = await registry.selected_files(db, **selection.model_dump())
+        deleted = await registry.delete_documents(db, **selection.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await db.commit()
+    await _purge_deleted_files(files)
+    return {"deleted": deleted}
+
+@app.post("/documents/bulk-status")
+async def bulk_update_document_status(body: DocumentStatusUpdate, db: AsyncSession = Depends(get_async_db)):
+    """Set the status of every document matching the selection"""
+    try:
+        updated = await registry.update_document_status(
+            db, body.new_status, ids=body.ids, product_id=body.product_id, status=body.status
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await db.commit()
+    return {"updated": updated}
+
+# ============ CACHE PRE-WARMING ============
+from prewarm import prewarm, schedule_prewarm
+from caches import cache_stats
+from llm_roles import role_stats
+
+@app.post("/admin/prewarm")
+def trigger_prewarm(background_tasks: BackgroundTasks, product_id: Optional[int] = None):
+    """Replay the most frequent recent questions (optionally for one product) to fill the caches"""
+    background_tasks.add_task(prewarm, product_id)
+    return {"message": "Pre-warming started", "product_id": product_id}
+
+@app.get("/admin/cache")
+def get_cache_stats():
+    return {
+        **cache_stats(),
+        "query_log": {"written": query_logger.written, "dropped": query_logger.dropped},
+        "residency": residency_manager.stats(),
+        "llm_roles": role_stats(),
+    }
+
+# ============ PROFILING ============
+# Send "X-Profile: 1" on /chat, /chat/stream or an upload to profile that one request
+from fastapi.responses import PlainTextResponse
+
+class ProfilingSettings(BaseModel):
+    enabled: Optional[bool] = None  # Profile every request
+    sample_rate: Optional[float] = None  # Or a random fraction of them
+
+@app.get("/admin/profiling")
+def get_profiling():
+    return {**profiling.settings(), "profiles": profiling.list_profiles()}
+
+@app.post("/admin/profiling")
+def set_profiling(body: ProfilingSettings):
+    return profiling.configure(enabled=body.enabled, sample_rate=body.sample_rate)
+
+@app.get("/admin/profiles/{profile_id}")
+def download_profile(profile_id: str, format: str = "json"):
+    """Stage breakdown and samples as JSON, or samples only as folded stacks (format=folded) for flame graph tools"""
+    try:
+        if format == "folded":
+            return PlainTextResponse(profiling.folded(profile_id))
+        return profiling.load(profile_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+# ============ INDEX SNAPSHOTS ============
+# Sync handlers: FastAPI runs them in its threadpool, so copying and compressing never blocks the event loop
+from fastapi.responses import FileResponse
+import shutil
+import tempfile
+
+@app.get("/admin/snapshots")
+def get_snapshots():
+    import snapshots
+    return snapshots.list_snapshots()
+
+@app.post("/admin/snapshots")
+def post_snapshot(include_uploads: Optional[bool] = None):
+    """Snapshot the registry and vector index online; ingestion pauses only while files are copied"""
+    import snapshots
+    if include_uploads is None:
+        include_uploads = snapshots.SNAPSHOT_INCLUDE_UPLOADS
+    manifest = snapshots.create_snapshot(include_uploads=include_uploads)
+    return {k: v for k, v in manifest.items() if k != "files"}
+
+@app.get("/admin/snapshots/{version}/download")
+def download_snapshot(version: str):
+    import snapshots
+    try:
+        path = snapshots.ensure_archive(version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return FileResponse(path, media_type="application/gzip", filename=os.path.basename(path))
+
+@app.post("/admin/snapshots/import")
+def import_snapshot(file: UploadFile = File(...)):
+    """Import an archive downloaded from another node; activate it separately"""
+    import snapshots
+    fd, temp_path = tempfile.mkstemp(suffix=".tar.gz", prefix=".import-", dir=snapshots.SNAPSHOT_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(file.file, out, 1024 * 1024)
+        manifest = snapshots.import_snapshot(temp_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        os.remove(temp_path)
+    return {k: v for k, v in manifest.items() if k != "files"}
+
+@app.post("/admin/snapshots/{version}/activate")
+def activate_snapshot(version: str, force: bool = False):
+    """Atomically switch the serving index to a snapshot; the replaced index is kept as previous-<timestamp>"""
+    import snapshots
+    try:
+        return snapshots.activate_snapshot(version, force=force)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 # ============ LEGACY UPLOAD (Global) ============
 @app.post("/upload")
 async def upload_document(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    from ingestion import process_upload
     return await process_upload(file, db)
 
 # ============ CHAT ENDPOINT ============
-from rag_graph import app_graph, is_greeting, GREETING_RESPONSES, TURKISH_GREETINGS, TURKISH_RESPONSES
+# rag_graph is imported inside the handlers (or by the warm-up task) to keep startup fast
 from langchain_core.messages import HumanMessage, AIMessage
-from typing import List
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sessions import session_store, fold_session_history, document_ids
 import json
-import random
+
+# Pipeline mode used when a request doesn't specify one (see rag_graph.CHAT_MODES). /chat and
+# /chat/stream share it so both answer the same way; clients opt into "fast" per request (the
+# dashboard does, to keep time-to-first-token low).
+CHAT_DEFAULT_MODE = os.getenv("CHAT_DEFAULT_MODE", "full")
 
 class ChatMessage(BaseModel):
     role: str  # "user" or "assistant"
@@ -151,12 +371,32 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     question: str
     product_id: Optional[int] = None  # Optional: filter by product
-    chat_history: Optional[List[ChatMessage]] = None  # Conversation history
+    chat_history: Optional[List[ChatMessage]] = None  # Conversation history (ignored when session_id is set)
+    session_id: Optional[str] = None  # Server-side session; send only the new question
     image: Optional[str] = None  # Base64 encoded image data if provided
+    mode: Optional[str] = None  # "full" (grading + rewrites) or "fast" (vector search straight to generation)
+    retrieval_mode: Optional[str] = None  # "rewrite" or "multi_query"; defaults to RETRIEVAL_MODE
 
-# Original non-streaming endpoint (keep for compatibility)
-@app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+class SessionCreate(BaseModel):
+    product_id: Optional[int] = None
+
+class FeedbackRequest(BaseModel):
+    request_id: str
+    feedback: str  # "up" or "down"
+
+def _resolve_conversation(request: ChatRequest):
+    """
+    Returns (session, history, summary, product_id).
+    With a session_id the history comes from the server-side session; otherwise from the request.
+    """
+    if request.session_id:
+        session = session_store.get(request.session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found or expired")
+        history, summary = session.history()
+        product_id = request.product_id if request.product_id is not None else session.product_id
+        return session, history, summary, product_id
+    
     # Convert chat_history to LangChain message format
     lc_history = []
     if request.chat_history:
@@ -165,58 +405,139 @@ async def chat_endpoint(request: ChatRequest):
                 lc_history.append(HumanMessage(content=msg.content))
             elif msg.role == "assistant":
                 lc_history.append(AIMessage(content=msg.content))
+    return None, lc_history, "", request.product_id
+
+# ============ SESSION ENDPOINTS ============
+
+@app.post("/sessions")
+def create_session(body: SessionCreate):
+    """Start a server-side conversation"""
+    session = session_store.create(product_id=body.product_id)
+    return {"session_id": session.id, "product_id": session.product_id}
+
+@app.get("/sessions/{session_id}")
+def get_session(session_id: str):
+    """Get the cached turns and running summary of a session"""
+    session = session_store.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session.to_dict()
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"message": "Session deleted"}
+
+def _graph_inputs(request: ChatRequest, session, history, summary, product_id):
+    """Validate per-request pipeline options and build the graph input state."""
+    from rag_graph import CHAT_MODES, RETRIEVAL_MODE
+    
+    mode = request.mode or CHAT_DEFAULT_MODE
+    if mode not in CHAT_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(CHAT_MODES)}")
+    retrieval_mode = request.retrieval_mode or RETRIEVAL_MODE
+    if retrieval_mode not in ("rewrite", "multi_query"):
+        raise HTTPException(status_code=400, detail="retrieval_mode must be 'rewrite' or 'multi_query'")
     
-    # Invoke LangGraph with product_id and chat_history
     inputs = {
         "question": request.question,
-        "product_id": request.product_id,
-        "chat_history": lc_history,
-        "image": request.image 
+        "product_id": product_id,
+        "chat_history": history,
+        "summary": summary,
+        "image": request.image,
+        "mode": mode,
     }
-    result = app_graph.invoke(inputs)
-    return {"answer": result.get("generation", "No answer generated.")}
+    if session:
+        cached = session.cached_standalone(request.question)
+        if cached:
+            inputs["standalone_question"] = cached
+    return inputs, retrieval_mode
+
+def _record_chat(request: ChatRequest, session, product_id, result: dict, latencies: dict) -> str:
+    """Log the request (write-behind) and append the turn to the session. Returns the request id."""
+    answer = result.get("generation", "No answer generated.")
+    standalone_question = result.get("standalone_question", request.question)
+    doc_ids = document_ids(result.get("documents"))
+    request_id = query_logger.log(
+        request.question, answer,
+        standalone_question=standalone_question,
+        product_id=product_id,
+        session_id=session.id if session else None,
+        retrieved_ids=doc_ids,
+        latencies=latencies,
+    )
+    if session:
+        session.record_turn(request.question, standalone_question, doc_ids, answer)
+    return request_id
 
-# NEW: Streaming chat endpoint with status events
+# Original non-streaming endpoint (keep for compatibility)
+@app.post("/chat")
+async def chat_endpoint(request: ChatRequest, background_tasks: BackgroundTasks, x_profile: Optional[str] = Header(None)):
+    from rag_graph import get_app_graph
+    
+    session, history, summary, product_id = _resolve_conversation(request)
+    inputs, retrieval_mode = _graph_inputs(request, session, history, summary, product_id)
+    
+    profile = profiling.start_profile("chat", request.question, x_profile)
+    t0 = time.perf_counter()
+    with profiling.activate(profile):
+        result = await get_app_graph(retrieval_mode).ainvoke(inputs, config=profiling.graph_config(profile))
+    latencies = dict(result.get("timings") or {})
+    latencies["total"] = (time.perf_counter() - t0) * 1000
+    
+    request_id = _record_chat(request, session, product_id, result, latencies)
+    response = {"answer": result.get("generation", "No answer generated."), "request_id": request_id}
+    if profile:
+        response["profile_id"] = profile.id
+    if session:
+        response["session_id"] = session.id
+        # Summarize older turns after the response is sent
+        if session.needs_summary():
+            background_tasks.add_task(fold_session_history, session)
+    return response
+
+@app.post("/chat/feedback")
+def chat_feedback(body: FeedbackRequest):
+    """Attach thumbs up/down feedback to a logged chat request"""
+    if body.feedback not in ("up", "down"):
+        raise HTTPException(status_code=400, detail="Feedback must be 'up' or 'down'")
+    query_logger.feedback(body.request_id, body.feedback)
+    return {"message": "Feedback recorded"}
+
+# Streaming chat endpoint with status events - same graph as /chat, driven through its event stream
 @app.post("/chat/stream")
-async def chat_stream_endpoint(request: ChatRequest):
+async def chat_stream_endpoint(request: ChatRequest, x_profile: Optional[str] = Header(None)):
     """Stream the LLM response with status updates and tokens using Server-Sent Events"""
-    from rag_graph import stream_generate_with_status
+    from rag_graph import stream_graph_events
     
-    # Convert chat_history to LangChain message format
-    lc_history = []
-    if request.chat_history:
-        for msg in request.chat_history:
-            if msg.role == "user":
-                lc_history.append(HumanMessage(content=msg.content))
-            elif msg.role == "assistant":
-                lc_history.append(AIMessage(content=msg.content))
+    session, history, summary, product_id = _resolve_conversation(request)
+    inputs, retrieval_mode = _graph_inputs(request, session, history, summary, product_id)
     
-    question = request.question
-    product_id = request.product_id
+    profile = profiling.start_profile("chat_stream", request.question, x_profile)
     
     async def generate_stream():
-        # Check if it's a greeting - instant response, no streaming needed
-        if is_greeting(question):
-            is_turkish = any(tr in question.lower() for tr in TURKISH_GREETINGS)
-            if is_turkish:
-                response = random.choice(TURKISH_RESPONSES)
-            else:
-                response = random.choice(GREETING_RESPONSES)
-            
-            # Emit greeting status
-            yield f"data: {json.dumps({'type': 'status', 'content': 'GREETING PROTOCOL INITIATED...'})}\n\n"
-            
-            # Stream the greeting character by character for smooth UI
-            for char in response:
-                yield f"data: {json.dumps({'type': 'token', 'content': char})}\n\n"
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
-            return
+        t0 = time.perf_counter()
+        first_token_ms = None
+        result = {}
+        with profiling.activate(profile):
+            async for event_type, content in stream_graph_events(inputs, retrieval_mode, profiling.graph_config(profile)):
+                if event_type == "final":
+                    result = content
+                    continue
+                if event_type == "token" and first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - t0) * 1000
+                yield f"data: {json.dumps({'type': event_type, 'content': content})}\n\n"
         
-        # For actual questions, use the streaming generator with status events
-        async for event_type, content in stream_generate_with_status(question, product_id, lc_history, image=request.image):
-            yield f"data: {json.dumps({'type': event_type, 'content': content})}\n\n"
-        
-        yield f"data: {json.dumps({'type': 'done'})}\n\n"
+        latencies = dict(result.get("timings") or {})
+        latencies["total"] = (time.perf_counter() - t0) * 1000
+        if first_token_ms is not None:
+            latencies["first_token"] = first_token_ms
+        request_id = _record_chat(request, session, product_id, result, latencies)
+        done = {"type": "done", "request_id": request_id}
+        if profile:
+            done["profile_id"] = profile.id
+        yield f"data: {json.dumps(done)}\n\n"
     
     return StreamingResponse(
         generate_stream(),
@@ -225,7 +546,9 @@ async def chat_stream_endpoint(request: ChatRequest):
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "X-Accel-Buffering": "no",  # Disable nginx buffering
-        }
+        },
+        # Summarize older turns once the stream has been fully sent
+        background=BackgroundTask(fold_session_history, session) if session else None,
     )
 
-
+IMPORT_SECONDS = time.perf_counter() - PROCESS_START
@@ -0,0 +1,517 @@
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- CONFIG ---
+NUMPY_STORE_PATH = os.getenv("NUMPY_STORE_PATH", "./data/numpy_store")
+NUMPY_QUANTIZATION = os.getenv("NUMPY_QUANTIZATION", "int8")  # float32, float16, int8
+# IVF: compacted segments at least this large are split into lists and a search only scores the
+# NUMPY_IVF_NPROBE lists nearest to the query. Trades recall for speed; 0 (default) disables it
+NUMPY_IVF_MIN_VECTORS = int(os.getenv("NUMPY_IVF_MIN_VECTORS", 0))
+NUMPY_IVF_NPROBE = int(os.getenv("NUMPY_IVF_NPROBE", 8))
+# Quantized codes are widened to float32 this many rows at a time while scoring
+NUMPY_SCORE_BLOCK_ROWS = int(os.getenv("NUMPY_SCORE_BLOCK_ROWS", 4096))
+# Every ingestion batch adds a part; past this many parts a segment is compacted in the background (0 disables)
+NUMPY_COMPACT_MAX_PARTS = int(os.getenv("NUMPY_COMPACT_MAX_PARTS", 8))
+
+QUANTIZATIONS = ("float32", "float16", "int8")
+GLOBAL_SEGMENT = "global"
+
+# --- VECTOR HELPERS ---
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _quantize(vectors: np.ndarray, quantization: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Return (codes, per-row scales). Scales are only used for int8."""
+    if quantization == "float32":
+        return vectors.astype(np.float32), None
+    if quantization == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def _dequantize(codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    vectors = np.asarray(codes, dtype=np.float32)
+    if scales is not None:
+        vectors = vectors * scales[:, None]
+    return vectors
+
+def _train_ivf(vectors: np.ndarray, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of the segment; returns normalized centroids."""
+    rng = np.random.default_rng(seed)
+    n_lists = max(1, int(np.sqrt(len(vectors))))
+    sample_size = min(len(vectors), n_lists * 256)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = sample[assignments == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids
+
+def _write_json(path: str, data: Any):
+    """Write JSON atomically so a crash never leaves a half-written manifest."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def segment_key(product_id: Optional[int]) -> str:
+    return f"product_{product_id}" if product_id else GLOBAL_SEGMENT
+
+def _collect(candidates: list, part: "_Part", scores: np.ndarray, k: int, rows: Optional[np.ndarray] = None):
+    """Append the top-k finite (score, part, row) of one query's scores; `rows` maps score positions to part rows."""
+    top = min(k, len(scores))
+    for i in np.argpartition(-scores, top - 1)[:top]:
+        if np.isfinite(scores[i]):
+            candidates.append((float(scores[i]), part, int(rows[i]) if rows is not None else int(i)))
+
+# --- SEGMENT ---
+class _Part:
+    """One immutable, memory-mapped block of a segment."""
+
+    def __init__(self, segment_path: str, name: str):
+        self.name = name
+        self.path = segment_path
+        base = os.path.join(segment_path, name)
+        self.codes = np.load(f"{base}.codes.npy", mmap_mode="r")
+        self.scales = np.load(f"{base}.scales.npy") if os.path.exists(f"{base}.scales.npy") else None
+        # IVF parts store their rows grouped by list; rows of list l are offsets[l]:offsets[l + 1]
+        self.offsets = np.load(f"{base}.offsets.npy") if os.path.exists(f"{base}.offsets.npy") else None
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        with open(f"{base}.jsonl") as f:
+            for line in f:
+                record = json.loads(line)
+                self.ids.append(record["id"])
+                self.texts.append(record["text"])
+                self.metadatas.append(record["metadata"])
+        self.alive = np.ones(len(self.ids), dtype=bool)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def pin(self) -> int:
+        """Copy the codes from the memory map into RAM; returns the bytes held."""
+        if isinstance(self.codes, np.memmap):
+            self.codes = np.array(self.codes)
+        return self.codes.nbytes
+
+    def unpin(self):
+        if not isinstance(self.codes, np.memmap):
+            self.codes = np.load(os.path.join(self.path, f"{self.name}.codes.npy"), mmap_mode="r")
+
+    def scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Query x row dot products, for all rows or just `rows`. Never holds a float32 copy of the whole part."""
+        codes = self.codes if rows is None else self.codes[rows]
+        if codes.dtype == np.float32:
+            return queries @ codes.T
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        block = np.empty((min(NUMPY_SCORE_BLOCK_ROWS, len(codes)), codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(codes), len(block)):
+            chunk = codes[start:start + len(block)]
+            np.copyto(block[:len(chunk)], chunk)
+            scores[:, start:start + len(chunk)] = queries @ block[:len(chunk)].T
+        if self.scales is not None:
+            scores *= (self.scales if rows is None else self.scales[rows])[None, :]
+        return scores
+
+class _Segment:
+    """
+    All vectors of one product (or the global, product-less pool).
+    Writes append a new part and then swap the manifest; reads only ever see complete parts.
+    """
+
+    def __init__(self, path: str, quantization: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.manifest_path = os.path.join(path, "manifest.json")
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"quantization": quantization, "parts": [], "next_part": 0, "deleted": []}
+        self.quantization = self.manifest["quantization"]
+        self.parts = [_Part(path, name) for name in self.manifest["parts"]]
+        self.pinned = False
+        centroids_path = os.path.join(path, "centroids.npy")
+        self.centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+        self._apply_deleted(set(self.manifest["deleted"]))
+
+    def __len__(self):
+        return sum(int(part.alive.sum()) for part in self.parts)
+
+    def _apply_deleted(self, deleted: set):
+        for part in self.parts:
+            for row, doc_id in enumerate(part.ids):
+                if doc_id in deleted:
+                    part.alive[row] = False
+
+    def _write_part(self, ids: List[str], texts: List[str], metadatas: List[Dict], vectors: np.ndarray) -> str:
+        name = f"part-{self.manifest['next_part']:05d}"
+        self.manifest["next_part"] += 1
+        base = os.path.join(self.path, name)
+        if self.centroids is not None:
+            # Group rows by nearest centroid so each list is one contiguous row range
+            lists = np.argmax(vectors @ self.centroids.T, axis=1)
+            order = np.argsort(lists, kind="stable")
+            ids, texts, metadatas = [ids[i] for i in order], [texts[i] for i in order], [metadatas[i] for i in order]
+            vectors = vectors[order]
+            offsets = np.searchsorted(lists[order], np.arange(len(self.centroids) + 1)).astype(np.int64)
+        codes, scales = _quantize(vectors, self.quantization)
+        np.save(f"{base}.codes.npy", codes)
+        if scales is not None:
+            np.save(f"{base}.scales.npy", scales)
+        if self.centroids is not None:
+            np.save(f"{base}.offsets.npy", offsets)
+        with open(f"{base}.jsonl", "w") as f:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                f.write(json.dumps({"id": doc_id, "text": text, "metadata": metadata}) + "\n")
+        return name
+
+    def append(self, ids: List[str], texts: List[str], metadatas: List[Dict], vectors: np.ndarray):
+        with self.lock:
+            # The directory only appears with the first write; reads never create segments
+            os.makedirs(self.path, exist_ok=True)
+            name = self._write_part(ids, texts, metadatas, _normalize(vectors))
+            self.manifest["parts"].append(name)
+            _write_json(self.manifest_path, self.manifest)
+            part = _Part(self.path, name)
+            if self.pinned:
+                part.pin()
+            self.parts.append(part)
+
+    def delete(self, ids: Iterable[str]):
+        with self.lock:
+            deleted = set(self.manifest["deleted"]) | set(ids)
+            self.manifest["deleted"] = sorted(deleted)
+            _write_json(self.manifest_path, self.manifest)
+            self._apply_deleted(deleted)
+
+    def compact(self):
+        """Merge all parts into one, drop deleted rows and (re)train IVF lists for large segments."""
+        with self.lock:
+            ids, texts, metadatas, blocks = [], [], [], []
+            for part in self.parts:
+                keep = np.flatnonzero(part.alive)
+                ids.extend(part.ids[i] for i in keep)
+                texts.extend(part.texts[i] for i in keep)
+                metadatas.extend(part.metadatas[i] for i in keep)
+                scales = part.scales[keep] if part.scales is not None else None
+                blocks.append(_dequantize(part.codes[keep], scales))
+            old_parts = list(self.manifest["parts"])
+            vectors = _normalize(np.concatenate(blocks)) if blocks else np.zeros((0, 0), dtype=np.float32)
+
+            centroids_path = os.path.join(self.path, "centroids.npy")
+            if NUMPY_IVF_MIN_VECTORS and len(vectors) >= NUMPY_IVF_MIN_VECTORS:
+                self.centroids = _train_ivf(vectors)
+                np.save(centroids_path, self.centroids)
+            else:
+                self.centroids = None
+                if os.path.exists(centroids_path):
+                    os.remove(centroids_path)
+
+            self.manifest["parts"] = [self._write_part(ids, texts, metadatas, vectors)] if ids else []
+            self.manifest["deleted"] = []
+            _write_json(self.manifest_path, self.manifest)
+            self.parts = [_Part(self.path, name) for name in self.manifest["parts"]]
+            if self.pinned:
+                for part in self.parts:
+                    part.pin()
+
+            for name in old_parts:
+                for suffix in (".codes.npy", ".scales.npy", ".offsets.npy", ".lists.npy", ".jsonl"):
+                    path = os.path.join(self.path, f"{name}{suffix}")
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def needs_compaction(self) -> bool:
+        """Too many parts to scan efficiently, or large enough for IVF lists that were never trained."""
+        if NUMPY_COMPACT_MAX_PARTS and len(self.parts) > NUMPY_COMPACT_MAX_PARTS:
+            return True
+        return bool(NUMPY_IVF_MIN_VECTORS) and self.centroids is None and len(self) >= NUMPY_IVF_MIN_VECTORS
+
+    def pin(self) -> int:
+        self.pinned = True
+        return sum(part.pin() for part in list(self.parts))
+
+    def unpin(self):
+        self.pinned = False
+        for part in list(self.parts):
+            part.unpin()
+
+    def search(self, queries: np.ndarray, k: int, where: Optional[Dict[str, Any]] = None):
+        """
+        Vectorized top-k for a batch of normalized queries.
+        Returns, per query, a list of (score, part, row) sorted by descending score.
+        """
+        probes = None
+        if self.centroids is not None:
+            n_probe = min(NUMPY_IVF_NPROBE, len(self.centroids))
+            probes = np.argpartition(-(queries @ self.centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+
+        candidates = [[] for _ in range(len(queries))]
+        for part in list(self.parts):
+            if not len(part):
+                continue
+            mask = part.alive
+            if where:
+                mask = mask & np.fromiter(
+                    (all(m.get(key) == value for key, value in where.items()) for m in part.metadatas),
+                    dtype=bool, count=len(part),
+                )
+            if probes is not None and part.offsets is not None:
+                # Only the row ranges of the probed lists are read and scored
+                for qi in range(len(queries)):
+                    rows = np.concatenate([np.arange(part.offsets[l], part.offsets[l + 1]) for l in probes[qi]])
+                    rows = rows[mask[rows]]
+                    if len(rows):
+                        _collect(candidates[qi], part, part.scores(queries[qi:qi + 1], rows)[0], k, rows)
+            else:
+                scores = part.scores(queries)
+                scores[:, ~mask] = -np.inf
+                for qi in range(len(queries)):
+                    _collect(candidates[qi], part, scores[qi], k)
+
+        return [sorted(c, key=lambda hit: hit[0], reverse=True)[:k] for c in candidates]
+
+# Segments are shared across store instances so repeated get_vector_store() calls don't re-open files.
+# This assumes a single writer process per store path (one uvicorn worker).
+_segments: Dict[str, _Segment] = {}
+_segments_lock = threading.Lock()
+
+def _open_segment(root: str, key: str, quantization: str, create: bool = False) -> Optional[_Segment]:
+    """Shared segment object for root/key; None if it was never written and `create` is False."""
+    path = os.path.join(root, key)
+    with _segments_lock:
+        if path not in _segments:
+            if not create and not os.path.exists(os.path.join(path, "manifest.json")):
+                return None
+            _segments[path] = _Segment(path, quantization)
+        return _segments[path]
+
+# One background compaction at a time; a segment already queued is not queued again
+_compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="numpy-compact")
+_compact_pending: set = set()
+_compact_pending_lock = threading.Lock()
+
+def _compact_in_background(root: str, key: str, quantization: str, guard: Callable[[], ContextManager]):
+    path = os.path.join(root, key)
+    try:
+        with guard():
+            # Resolved only now: the store may have been reopened (snapshot activation) since queueing
+            segment = _open_segment(root, key, quantization)
+            if segment and segment.needs_compaction():
+                parts = len(segment.parts)
+                segment.compact()
+                print(f"---NUMPY STORE: COMPACTED {key} ({parts} parts -> {len(segment.parts)})---")
+    except Exception as e:
+        print(f"---NUMPY STORE: COMPACTION OF {key} FAILED: {e}---")
+    finally:
+        with _compact_pending_lock:
+            _compact_pending.discard(path)
+
+# --- STORE ---
+class NumpyVectorStore(VectorStore):
+    """
+    In-process vector store: memory-mapped, optionally quantized embedding matrices,
+    one segment per product, brute-force (or IVF-probed) cosine top-k.
+    Drop-in for the parts of the Chroma API the app uses (add_documents, as_retriever, get, delete).
+    """
+
+    def __init__(self, embedding_function: Embeddings, path: str = NUMPY_STORE_PATH, quantization: str = NUMPY_QUANTIZATION):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization '{quantization}' (expected one of {QUANTIZATIONS})")
+        self._embedding_function = embedding_function
+        self.path = path
+        self.quantization = quantization
+        os.makedirs(path, exist_ok=True)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def _segment(self, key: str, create: bool = False) -> Optional[_Segment]:
+        return _open_segment(self.path, key, self.quantization, create=create)
+
+    def _segments_for(self, filter: Optional[Dict[str, Any]]) -> Tuple[List[_Segment], Dict[str, Any]]:
+        """Resolve a product_id filter to its existing segment(s); remaining keys become a metadata filter."""
+        where = dict(filter or {})
+        if "product_id" in where:
+            keys = [segment_key(where.pop("product_id"))]
+        else:
+            keys = sorted(d for d in os.listdir(self.path) if os.path.isdir(os.path.join(self.path, d)))
+        segments = [self._segment(key) for key in keys]
+        return [segment for segment in segments if segment is not None], where
+
+    # --- Residency ---
+    def pin_segment(self, product_id: Optional[int]) -> int:
+        """Keep a product's vectors in RAM instead of paging them from disk; returns the bytes held."""
+        segment = self._segment(segment_key(product_id))
+        return segment.pin() if segment else 0
+
+    def unpin_segment(self, product_id: Optional[int]):
+        segment = self._segment(segment_key(product_id))
+        if segment:
+            segment.unpin()
+
+    # --- Writes ---
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        vectors = np.asarray(embeddings, dtype=np.float32)
+
+        groups: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(segment_key(metadata.get("product_id")), []).append(i)
+        for key, rows in groups.items():
+            self._segment(key, create=True).append(
+                [ids[i] for i in rows], [texts[i] for i in rows], [metadatas[i] for i in rows], vectors[rows]
+            )
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        embeddings = self._embedding_function.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas=metadatas, ids=ids)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        segments, _ = self._segments_for(None)
+        for segment in segments:
+            segment.delete(ids)
+        return True
+
+    def compact(self, product_id: Optional[int] = None):
+        """Compact one product's segment, or every segment when product_id is None."""
+        segments, _ = self._segments_for({"product_id": product_id} if product_id else None)
+        for segment in segments:
+            segment.compact()
+
+    def schedule_compaction(self, product_id: Optional[int], guard: Callable[[], ContextManager] = nullcontext):
+        """
+        Queue a background compaction of the product's segment if it needs one. `guard` is
+        entered around the compaction (ingestion passes the shared index lock, so a snapshot
+        never copies a half-rewritten segment). Searches keep reading the old parts meanwhile.
+        """
+        key = segment_key(product_id)
+        segment = self._segment(key)
+        if not segment or not segment.needs_compaction():
+            return
+        path = os.path.join(self.path, key)
+        with _compact_pending_lock:
+            if path in _compact_pending:
+                return
+            _compact_pending.add(path)
+        _compactor.submit(_compact_in_background, self.path, key, self.quantization, guard)
+
+    # --- Reads ---
+    def get(
+        self,
+        ids: Optional[Union[str, List[str]]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> Dict[str, List]:
+        """
+        Chroma-compatible get(): live documents, optionally restricted to `ids` and filtered by
+        metadata equality, paged with offset/limit. "ids" is always returned, plus whichever of
+        documents/metadatas/embeddings `include` names (default documents and metadatas).
+        """
+        if kwargs:
+            raise ValueError(f"Unsupported get() arguments: {sorted(kwargs)}")
+        include = ["documents", "metadatas"] if include is None else list(include)
+        unknown = set(include) - {"documents", "metadatas", "embeddings"}
+        if unknown:
+            raise ValueError(f"Unsupported include values: {sorted(unknown)}")
+        wanted = {ids} if isinstance(ids, str) else set(ids) if ids is not None else None
+
+        result = {"ids": [], **{field: [] for field in include}}
+        skip = offset or 0
+        segments, where = self._segments_for(where)
+        for segment in segments:
+            for part in list(segment.parts):
+                for row in np.flatnonzero(part.alive):
+                    if limit is not None and len(result["ids"]) >= limit:
+                        return result
+                    metadata = part.metadatas[row]
+                    if wanted is not None and part.ids[row] not in wanted:
+                        continue
+                    if where and not all(metadata.get(key) == value for key, value in where.items()):
+                        continue
+                    if skip:
+                        skip -= 1
+                        continue
+                    result["ids"].append(part.ids[row])
+                    if "documents" in include:
+                        result["documents"].append(part.texts[row])
+                    if "metadatas" in include:
+                        result["metadatas"].append(metadata)
+                    if "embeddings" in include:
+                        scales = part.scales[row:row + 1] if part.scales is not None else None
+                        result["embeddings"].append(_dequantize(part.codes[row:row + 1], scales)[0].tolist())
+        return result
+
+    def batch_similarity_search_by_vectors(self, embeddings: List[List[float]], k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[List[Tuple[Document, float]]]:
+        """Top-k for many query vectors in one vectorized pass per segment."""
+        queries = _normalize(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        segments, where = self._segments_for(filter)
+        merged = [[] for _ in range(len(queries))]
+        for segment in segments:
+            for qi, hits in enumerate(segment.search(queries, k, where)):
+                merged[qi].extend(hits)
+        results = []
+        for hits in merged:
+            hits = sorted(hits, key=lambda hit: hit[0], reverse=True)[:k]
+            results.append([
+                (Document(page_content=part.texts[row], metadata=part.metadatas[row], id=part.ids[row]), score)
+                for score, part, row in hits
+            ])
+        return results
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        return self.batch_similarity_search_by_vectors([embedding], k=k, filter=filter)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        embedding = self._embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] -> relevance in [0, 1]
+        return lambda score: (score + 1.0) / 2.0
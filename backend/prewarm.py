@@ -0,0 +1,104 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import func, desc
+from database import SessionLocal, FeedbackLogs
+from caches import answer_cache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- CONFIG ---
+PREWARM_ON_STARTUP = os.getenv("PREWARM_ON_STARTUP", "True").lower() == "true"
+PREWARM_TOP_N = int(os.getenv("PREWARM_TOP_N", 20))  # Questions replayed per product
+PREWARM_WINDOW_HOURS = int(os.getenv("PREWARM_WINDOW_HOURS", 168))  # Look-back window for "recent"
+PREWARM_MODE = os.getenv("PREWARM_MODE", "fast")  # Pipeline mode replayed; the dashboard, where most traffic comes from, sends "fast"
+# After an upload, wait until a product has had no uploads for this long, then prewarm it once
+PREWARM_DEBOUNCE_S = float(os.getenv("PREWARM_DEBOUNCE_S", 60))
+
+def frequent_questions(product_id: Optional[int] = None, top_n: int = PREWARM_TOP_N, window_hours: int = PREWARM_WINDOW_HOURS) -> Dict[Optional[int], List[str]]:
+    """Most frequent recent standalone questions, grouped by product."""
+    since = datetime.utcnow() - timedelta(hours=window_hours)
+    db = SessionLocal()
+    try:
+        hits = func.count(FeedbackLogs.id).label("hits")
+        query = (
+            db.query(FeedbackLogs.product_id, FeedbackLogs.standalone_query, hits)
+            .filter(FeedbackLogs.timestamp >= since, FeedbackLogs.standalone_query.isnot(None))
+            .group_by(FeedbackLogs.product_id, FeedbackLogs.standalone_query)
+            .order_by(desc(hits))
+        )
+        if product_id is not None:
+            query = query.filter(FeedbackLogs.product_id == product_id)
+        grouped: Dict[Optional[int], List[str]] = {}
+        for row_product, question, _ in query.all():
+            questions = grouped.setdefault(row_product, [])
+            if len(questions) < top_n:
+                questions.append(question)
+        return grouped
+    finally:
+        db.close()
+
+def prewarm(product_id: Optional[int] = None, top_n: int = PREWARM_TOP_N) -> int:
+    """
+    Replay frequent questions through the graph with no history, which fills the
+    embedding, retrieval and answer caches. Blocking; run it in a background task.
+    Returns the number of questions replayed.
+    """
+    from rag_graph import get_app_graph, answer_cache_key
+
+    graph = get_app_graph()
+    replayed = 0
+    for pid, questions in frequent_questions(product_id, top_n).items():
+        for question in questions:
+            state = {"question": question, "product_id": pid, "chat_history": [], "mode": PREWARM_MODE}
+            if answer_cache.get(answer_cache_key(state, question)):
+                continue
+            try:
+                graph.invoke(state)
+                replayed += 1
+            except Exception as e:
+                print(f"---PREWARM FAILED FOR '{question}': {e}---")
+    print(f"---PREWARM: REPLAYED {replayed} QUESTIONS (product={product_id if product_id is not None else 'all'})---")
+    return replayed
+
+# --- SCHEDULING (uploads) ---
+_schedule_lock = threading.Lock()
+_timers: Dict[Optional[int], threading.Timer] = {}
+_running: set = set()
+_rerun: set = set()
+
+def schedule_prewarm(product_id: Optional[int]):
+    """
+    Prewarm a product once uploads to it have been quiet for PREWARM_DEBOUNCE_S. Each upload
+    restarts the wait, so N uploads in a row cost one replay instead of N; an upload during a
+    replay queues exactly one more.
+    """
+    with _schedule_lock:
+        timer = _timers.get(product_id)
+        if timer is not None:
+            timer.cancel()
+        timer = threading.Timer(PREWARM_DEBOUNCE_S, _run_scheduled, args=(product_id,))
+        timer.daemon = True
+        _timers[product_id] = timer
+        timer.start()
+
+def _run_scheduled(product_id: Optional[int]):
+    with _schedule_lock:
+        if _timers.get(product_id) is threading.current_thread():
+            del _timers[product_id]
+        if product_id in _running:
+            _rerun.add(product_id)
+            return
+        _running.add(product_id)
+    while True:
+        try:
+            prewarm(product_id)
+        except Exception as e:
+            print(f"---PREWARM FAILED: {e}---")
+        with _schedule_lock:
+            if product_id not in _rerun:
+                _running.discard(product_id)
+                return
+            _rerun.discard(product_id)
@@ -0,0 +1,305 @@
+import contextvars
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- CONFIG ---
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.0))  # Fraction of requests profiled without being asked
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))  # Stack sampling interval
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./data/profiles")
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", 200))  # Oldest profiles are deleted beyond this
+PROFILE_MAX_DEPTH = 64  # Frames kept per sampled stack
+
+# Admin toggle: profile every request until switched off
+_settings = {"enabled": False, "sample_rate": PROFILE_SAMPLE_RATE}
+
+_current: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar("profile", default=None)
+
+def configure(enabled: Optional[bool] = None, sample_rate: Optional[float] = None) -> dict:
+    if enabled is not None:
+        _settings["enabled"] = enabled
+    if sample_rate is not None:
+        _settings["sample_rate"] = min(max(sample_rate, 0.0), 1.0)
+    return dict(_settings)
+
+def settings() -> dict:
+    return dict(_settings)
+
+def _requested(value: Optional[str]) -> bool:
+    return bool(value) and value.lower() not in ("0", "false", "no", "off")
+
+# --- PROFILE ---
+class Profile:
+    """Per-stage wall/CPU totals and folded stack samples for one request."""
+
+    def __init__(self, kind: str, label: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.label = label[:200]
+        self.started_at = datetime.utcnow().isoformat()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.samples: Counter = Counter()
+        self.lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        # Per thread: stack of [name, wall start, cpu start, child wall]
+        self._stacks: Dict[int, List[list]] = {}
+        self._llm_starts: Dict[UUID, tuple] = {}
+
+    def threads(self) -> List[int]:
+        with self.lock:
+            return [tid for tid, stack in self._stacks.items() if stack]
+
+    def _record(self, name: str, wall: float, cpu: Optional[float]):
+        stats = self.stages.setdefault(name, {"count": 0, "wall_ms": 0.0, "self_wall_ms": 0.0, "cpu_ms": 0.0})
+        stats["count"] += 1
+        stats["wall_ms"] += wall * 1000
+        if cpu is not None:
+            stats["cpu_ms"] += cpu * 1000
+        return stats
+
+    def enter(self, name: str):
+        tid = threading.get_ident()
+        with self.lock:
+            self._stacks.setdefault(tid, []).append([name, time.perf_counter(), time.thread_time(), 0.0])
+
+    def exit(self):
+        tid = threading.get_ident()
+        now, cpu_now = time.perf_counter(), time.thread_time()
+        with self.lock:
+            stack = self._stacks[tid]
+            name, t0, cpu0, child = stack.pop()
+            wall = now - t0
+            stats = self._record(name, wall, cpu_now - cpu0)
+            stats["self_wall_ms"] += (wall - child) * 1000
+            if stack:
+                stack[-1][3] += wall
+
+    def llm_start(self, run_id: UUID, name: str):
+        with self.lock:
+            self._llm_starts[run_id] = (name, time.perf_counter())
+
+    def llm_end(self, run_id: UUID):
+        tid = threading.get_ident()
+        with self.lock:
+            started = self._llm_starts.pop(run_id, None)
+            if started is None:
+                return
+            name, t0 = started
+            wall = time.perf_counter() - t0
+            # The model runs in Ollama, so this process's CPU time says nothing useful here
+            stats = self._record(name, wall, None)
+            stats["self_wall_ms"] += wall * 1000
+            stack = self._stacks.get(tid)
+            if stack:
+                stack[-1][3] += wall
+
+    def add_sample(self, stack: str):
+        with self.lock:
+            self.samples[stack] += 1
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            stages = {
+                name: {key: round(value, 2) for key, value in stats.items()}
+                for name, stats in sorted(self.stages.items(), key=lambda item: -item[1]["wall_ms"])
+            }
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "label": self.label,
+                "started_at": self.started_at,
+                "wall_ms": round((time.perf_counter() - self._t0) * 1000, 2),
+                "sample_interval_ms": PROFILE_INTERVAL_MS,
+                "stages": stages,
+                "samples": dict(self.samples.most_common()),
+            }
+
+class _Stage:
+    __slots__ = ("profile", "name")
+
+    def __init__(self, profile: Profile, name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.profile.enter(self.name)
+
+    def __exit__(self, *exc):
+        self.profile.exit()
+        return False
+
+_NO_STAGE = nullcontext()
+
+def stage(name: str):
+    """Time a block as a named stage of the current profile; a shared no-op when not profiling."""
+    profile = _current.get()
+    if profile is None:
+        return _NO_STAGE
+    return _Stage(profile, name)
+
+# --- LLM CALLS ---
+class _LLMCallbackHandler(BaseCallbackHandler):
+    """Times every chat model call as stage llm:<graph node>."""
+
+    run_inline = True
+
+    def __init__(self, profile: Profile):
+        self.profile = profile
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List, *, run_id: UUID, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        node = (metadata or {}).get("langgraph_node") or "llm"
+        self.profile.llm_start(run_id, f"llm:{node}")
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any):
+        self.profile.llm_end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self.profile.llm_end(run_id)
+
+def graph_config(profile: Optional[Profile]) -> Optional[dict]:
+    """Run config for a graph call: callbacks are only attached when the request is profiled."""
+    if profile is None:
+        return None
+    return {"callbacks": [_LLMCallbackHandler(profile)]}
+
+# --- SAMPLER ---
+def _fold(frame) -> str:
+    names = []
+    while frame is not None and len(names) < PROFILE_MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class _Sampler:
+    """
+    One background thread that samples the stacks of threads currently inside a stage of an
+    active profile. It only runs while at least one profile is active.
+    """
+
+    def __init__(self):
+        self._profiles: set = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: Profile):
+        with self._lock:
+            self._profiles.discard(profile)
+
+    def _run(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        while True:
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                profiles = list(self._profiles)
+            frames = sys._current_frames()
+            for profile in profiles:
+                for tid in profile.threads():
+                    frame = frames.get(tid)
+                    if frame is not None:
+                        profile.add_sample(_fold(frame))
+            del frames
+            time.sleep(interval)
+
+_sampler = _Sampler()
+
+# --- REQUESTS ---
+def start_profile(kind: str, label: str, requested: Optional[str] = None) -> Optional[Profile]:
+    """A new profile if this request was asked for (header), profiling is toggled on, or it is sampled."""
+    if not (_requested(requested) or _settings["enabled"] or (_settings["sample_rate"] and random.random() < _settings["sample_rate"])):
+        return None
+    return Profile(kind, label)
+
+class _Activation:
+    # Only threads inside a stage are sampled, so the shared event loop thread isn't attributed
+    # to whichever request happens to be profiled
+    def __init__(self, profile: Profile):
+        self.profile = profile
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current.set(self.profile)
+        _sampler.add(self.profile)
+        return self.profile
+
+    def __exit__(self, *exc):
+        _sampler.remove(self.profile)
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            pass  # A streaming response closed from another task; that context is discarded anyway
+        try:
+            save(self.profile)
+        except OSError as e:
+            print(f"---COULD NOT SAVE PROFILE {self.profile.id}: {e}---")
+        return False
+
+def activate(profile: Optional[Profile]):
+    """Make the profile current for the block (and for threads/tasks that copy the context)."""
+    if profile is None:
+        return _NO_STAGE
+    return _Activation(profile)
+
+# --- STORAGE ---
+def _path(profile_id: str) -> str:
+    if not all(c in "0123456789abcdef" for c in profile_id) or len(profile_id) != 32:
+        raise ValueError(f"Invalid profile id: {profile_id!r}")
+    return os.path.join(PROFILE_DIR, f"{profile_id}.json")
+
+def save(profile: Profile):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    data = profile.to_dict()
+    with open(_path(profile.id), "w") as f:
+        json.dump(data, f)
+    print(f"---PROFILE {profile.id} ({profile.kind}, {data['wall_ms']:.0f} ms) SAVED---")
+
+    stored = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in stored[:-PROFILE_MAX_STORED]:
+        os.remove(entry.path)
+
+def load(profile_id: str) -> dict:
+    with open(_path(profile_id)) as f:
+        return json.load(f)
+
+def folded(profile_id: str) -> str:
+    """Samples in folded-stack format (one 'frame;frame;frame count' per line) for flame graph tools."""
+    return "".join(f"{stack} {count}\n" for stack, count in load(profile_id)["samples"].items())
+
+def list_profiles() -> List[dict]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.name.endswith(".json"):
+            try:
+                with open(entry.path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            profiles.append({key: data[key] for key in ("id", "kind", "label", "started_at", "wall_ms")})
+    return sorted(profiles, key=lambda p: p["started_at"], reverse=True)
@@ -0,0 +1,126 @@
+import os
+import queue
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert, update
+from database import SessionLocal, FeedbackLogs
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- CONFIG ---
+QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "True").lower() == "true"
+QUERY_LOG_QUEUE_SIZE = int(os.getenv("QUERY_LOG_QUEUE_SIZE", 10000))  # Entries beyond this are dropped, never blocked on
+QUERY_LOG_BATCH_SIZE = int(os.getenv("QUERY_LOG_BATCH_SIZE", 200))
+QUERY_LOG_FLUSH_SECONDS = float(os.getenv("QUERY_LOG_FLUSH_SECONDS", 2.0))
+
+_STOP = object()
+
+class QueryLogger:
+    """
+    Write-behind logger for chat requests.
+    The request path only does a non-blocking queue put; a background thread
+    drains the queue and writes batches with one INSERT (and UPDATEs for feedback).
+    """
+
+    def __init__(self):
+        self._queue: "queue.Queue" = queue.Queue(maxsize=QUERY_LOG_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.dropped = 0
+        self.written = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Flush everything queued so far and stop the writer thread."""
+        if self._thread and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _enqueue(self, item):
+        if not QUERY_LOG_ENABLED:
+            return
+        self.start()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def log(
+        self,
+        question: str,
+        answer: str,
+        standalone_question: Optional[str] = None,
+        product_id: Optional[int] = None,
+        session_id: Optional[str] = None,
+        retrieved_ids: Optional[List[str]] = None,
+        latencies: Optional[Dict[str, float]] = None,
+        request_id: Optional[str] = None,
+    ) -> str:
+        """Queue one chat record; returns the request id the client can attach feedback to."""
+        request_id = request_id or uuid.uuid4().hex
+        self._enqueue(("insert", {
+            "request_id": request_id,
+            "session_id": session_id,
+            "product_id": product_id,
+            "query": question,
+            "standalone_query": standalone_question,
+            "response": answer,
+            "retrieved_ids": retrieved_ids or [],
+            "latencies": {k: round(v, 1) for k, v in (latencies or {}).items()},
+            "timestamp": datetime.utcnow(),
+        }))
+        return request_id
+
+    def feedback(self, request_id: str, feedback: str):
+        self._enqueue(("feedback", {"request_id": request_id, "feedback": feedback}))
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=QUERY_LOG_FLUSH_SECONDS))
+            except queue.Empty:
+                continue
+            while len(batch) < QUERY_LOG_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            self._flush([item for item in batch if item is not _STOP])
+            if stop:
+                return
+
+    def _flush(self, batch: List[Any]):
+        if not batch:
+            return
+        rows = [payload for kind, payload in batch if kind == "insert"]
+        feedback = [payload for kind, payload in batch if kind == "feedback"]
+        db = SessionLocal()
+        try:
+            if rows:
+                db.execute(insert(FeedbackLogs), rows)
+            # Inserts go first so feedback for a request in the same batch finds its row
+            for item in feedback:
+                db.execute(
+                    update(FeedbackLogs)
+                    .where(FeedbackLogs.request_id == item["request_id"])
+                    .values(feedback=item["feedback"])
+                )
+            db.commit()
+            self.written += len(rows)
+        except Exception as e:
+            db.rollback()
+            print(f"---QUERY LOG FLUSH FAILED ({len(batch)} entries dropped): {e}---")
+        finally:
+            db.close()
+
+query_logger = QueryLogger()
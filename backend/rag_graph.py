@@ -1,12 +1,19 @@
 import os
-from typing import List, Dict, Any, Literal, Optional
+import re
+import json
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from contextlib import nullcontext
+from functools import lru_cache, wraps
+from typing import List, Dict, Any, Callable, Literal, Optional
 from typing_extensions import TypedDict
 
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
 from langchain_ollama import ChatOllama
-from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
-from langchain_chroma import Chroma
+from langchain_core.output_parsers import StrOutputParser
 from langchain_classic.retrievers.ensemble import EnsembleRetriever
 from langchain_community.retrievers import BM25Retriever
 from langchain_core.documents import Document
@@ -15,14 +22,29 @@ from langgraph.graph import StateGraph, END
 
 # from flashrank import Ranker, RerankRequest # Removed due to ONNX issues
 from chroma_utils import get_vector_store
+from caches import retrieval_cache, answer_cache
+from docstore import expand_to_parents
+from residency import RESIDENCY_ENABLED, residency_manager
+from profiling import stage
+from llm_roles import ROLE_CONFIG, CASCADE_ESCALATION, record_call
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # --- CONFIG ---
-LLM_MODEL = os.getenv("LLM_MODEL_NAME", "llama3.1")
 VISION_MODEL = os.getenv("VISION_MODEL_NAME", "llama3.2-vision")
 RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 5))
+BM25_WEIGHT = float(os.getenv("BM25_WEIGHT", 0.5))  # Ensemble weight of BM25; vector search gets the rest
+MAX_REWRITES = int(os.getenv("MAX_REWRITES", 2))  # Maximum number of query rewrites before giving up
+# "rewrite": serial rewrite -> retrieve -> grade loop; "multi_query": one round of parallel query variants
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "rewrite").lower()
+MULTI_QUERY_COUNT = int(os.getenv("MULTI_QUERY_COUNT", 3))  # Variants generated in addition to the original question
+MULTI_QUERY_MAX_DOCS = int(os.getenv("MULTI_QUERY_MAX_DOCS", RETRIEVAL_TOP_K * 2))  # Fused docs sent to the grader
+# Per-request pipeline mode: "full" = hybrid retrieval + grading (+ rewrites); "fast" = vector search straight to generate
+CHAT_MODES = ("full", "fast")
+# Retrieved child chunks are expanded to parent sections up to this many context tokens
+# (below the ~1250 tokens of the former five 1000-char flat chunks)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1000))
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "5m")
 
@@ -34,11 +56,85 @@ class GraphState(TypedDict):
     generation: str
     web_search: str  # "Yes" or "No" - though we are offline, logical placeholder for fallback
     status: str  # For UI feedback: "analyzing", "retrieving", "verifying", "generating"
-    chat_history: List[BaseMessage]  # Conversation memory
+    chat_history: List[BaseMessage]  # Conversation memory (recent window when a session is used)
+    summary: str  # Running summary of older session turns, if any
+    standalone_question: str  # Contextualized question (pre-filled from the session cache on retries)
     rewrite_count: int  # Track number of query rewrites to prevent infinite loops
+    timings: Dict[str, float]  # Node name -> accumulated wall time in ms (for the query log)
+    image: Optional[str]  # Base64 image data; routes the request to the vision model
+    mode: str  # "full" or "fast" (see CHAT_MODES)
+
+def timed(name: str, node):
+    """Wrap a graph node so its wall time is accumulated into state["timings"]."""
+    @wraps(node)
+    def wrapper(state: GraphState):
+        t0 = time.perf_counter()
+        with stage(name):
+            result = node(state)
+        timings = dict(state.get("timings") or {})
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - t0) * 1000
+        return {**result, "timings": timings}
+    return wrapper
+
+def answer_cache_key(state: GraphState, question: str):
+    """Answers are only cached for questions without conversational context."""
+    if state.get("chat_history") or state.get("summary") or state.get("image"):
+        return None
+    return (state.get("mode") or "full", state.get("product_id"), question.strip().lower())
 
 # --- LLM ---
-llm = ChatOllama(model=LLM_MODEL, temperature=0, base_url=OLLAMA_BASE_URL, keep_alive=OLLAMA_KEEP_ALIVE)
+_role_slots = {
+    role: threading.BoundedSemaphore(config["concurrency"])
+    for role, config in ROLE_CONFIG.items() if config["concurrency"] > 0
+}
+
+class RoleChatOllama(ChatOllama):
+    """ChatOllama that holds one of its role's concurrency slots (if limited) for the whole call."""
+    role: str = "answer"
+
+    def _generate(self, *args, **kwargs):
+        with _role_slots.get(self.role) or nullcontext():
+            return super()._generate(*args, **kwargs)
+
+    def _stream(self, *args, **kwargs):
+        with _role_slots.get(self.role) or nullcontext():
+            yield from super()._stream(*args, **kwargs)
+
+@lru_cache(maxsize=None)
+def get_llm(role: str = "answer") -> ChatOllama:
+    """Chat model for a role (see llm_roles), created on first use rather than at import time."""
+    config = ROLE_CONFIG[role]
+    return RoleChatOllama(model=config["model"], temperature=0, base_url=OLLAMA_BASE_URL, keep_alive=config["keep_alive"], role=role)
+
+def invoke_role(role: str, prompt, inputs: Dict[str, Any], confident: Optional[Callable[[str], bool]] = None) -> str:
+    """
+    Run prompt -> role model -> string. With CASCADE_ESCALATION on, an output that fails the
+    role's `confident` check is asked again of the answer model (if the role uses a different one).
+    """
+    output = (prompt | get_llm(role) | StrOutputParser()).invoke(inputs)
+    escalate = (
+        CASCADE_ESCALATION and confident is not None and not confident(output)
+        and ROLE_CONFIG[role]["model"] != ROLE_CONFIG["answer"]["model"]
+    )
+    record_call(role, escalated=escalate)
+    if escalate:
+        print(f"---ESCALATING {role.upper()} TO {ROLE_CONFIG['answer']['model']}---")
+        output = (prompt | get_llm("answer") | StrOutputParser()).invoke(inputs)
+    return output
+
+def is_binary_verdict(output: str) -> bool:
+    """A clear yes or no: starts with one of them and doesn't mention the other."""
+    words = re.findall(r"[a-z]+", output.lower())
+    return bool(words) and words[0] in ("yes", "no") and not {"yes", "no"} <= set(words)
+
+def is_reformulation(output: str, question: str) -> bool:
+    """A single non-empty question-sized line rather than an answer or an explanation."""
+    output = output.strip()
+    return bool(output) and "\n" not in output and len(output) <= max(200, 3 * len(question))
+
+@lru_cache(maxsize=None)
+def get_vision_llm() -> ChatOllama:
+    return ChatOllama(model=VISION_MODEL, temperature=0, base_url=OLLAMA_BASE_URL, keep_alive=OLLAMA_KEEP_ALIVE)
 
 # --- GREETING PATTERNS ---
 GREETING_PATTERNS = [
@@ -65,7 +161,10 @@ def classify_intent(state: GraphState):
     print("---CLASSIFY INTENT---")
     question = state["question"]
     
-    if is_greeting(question):
+    if state.get("image"):
+        print("---DETECTED IMAGE, ROUTING TO VISION MODEL---")
+        return {"status": "vision"}
+    elif is_greeting(question):
         print("---DETECTED GREETING, SKIPPING RAG---")
         return {"status": "greeting"}
     else:
@@ -76,6 +175,8 @@ def intent_router(state: GraphState):
     """Route based on intent classification"""
     if state.get("status") == "greeting":
         return "greeting_response"
+    if state.get("status") == "vision":
+        return "vision"
     return "contextualize"
 
 # --- PREDEFINED GREETING RESPONSES (No LLM call - instant!) ---
@@ -113,6 +214,26 @@ def greeting_response(state: GraphState):
     
     return {"generation": response, "status": "generated"}
 
+# --- CONVERSATION SUMMARY ---
+def history_with_summary(chat_history: List[BaseMessage], summary: Optional[str]) -> List[BaseMessage]:
+    """Prepend the running summary of older turns (if any) to the recent history window."""
+    if not summary:
+        return list(chat_history or [])
+    return [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] + list(chat_history or [])
+
+def summarize_history(summary: str, messages: List[BaseMessage]) -> str:
+    """Fold older messages into the running summary (one LLM call over only the new messages)."""
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", """You maintain a concise running summary of a support conversation.
+Update the summary with the new messages. Keep product names, device models, error codes and
+steps already tried. Return only the updated summary."""),
+        ("human", "Current summary:\n{summary}\n\nNew messages:\n{messages}")
+    ])
+    transcript = "\n".join(
+        f"{'User' if isinstance(m, HumanMessage) else 'Assistant'}: {m.content}" for m in messages
+    )
+    return invoke_role("answer", prompt, {"summary": summary or "(empty)", "messages": transcript})
+
 # --- CONTEXTUALIZE QUESTION (for chat history) ---
 def contextualize_question(state: GraphState):
     """
@@ -121,12 +242,23 @@ def contextualize_question(state: GraphState):
     """
     print("---CONTEXTUALIZE QUESTION---")
     question = state["question"]
-    chat_history = state.get("chat_history", [])
+    
+    # Session cache hit (e.g. the same question re-asked) - no LLM call needed
+    if state.get("standalone_question"):
+        print("---USING CACHED STANDALONE QUESTION---")
+        return {"question": state["standalone_question"]}
+    
+    chat_history = history_with_summary(state.get("chat_history", []), state.get("summary"))
     
     # If no history, return question as-is
     if not chat_history:
         print("---NO HISTORY, USING ORIGINAL QUESTION---")
-        return {"question": question}
+        cached = answer_cache.get(answer_cache_key(state, question))
+        if cached:
+            print("---ANSWER CACHE HIT---")
+            generation, documents = cached
+            return {"question": question, "standalone_question": question, "generation": generation, "documents": documents, "status": "cached"}
+        return {"question": question, "standalone_question": question}
     
     # Create a standalone question using chat history
     contextualize_prompt = ChatPromptTemplate.from_messages([
@@ -137,21 +269,68 @@ Do NOT answer the question, just reformulate it if needed and otherwise return i
         ("human", "{question}")
     ])
     
-    chain = contextualize_prompt | llm | StrOutputParser()
-    standalone_question = chain.invoke({
-        "chat_history": chat_history,
-        "question": question
-    })
+    standalone_question = invoke_role(
+        "contextualizer", contextualize_prompt,
+        {"chat_history": chat_history, "question": question},
+        confident=lambda output: is_reformulation(output, question),
+    )
     
     print(f"---STANDALONE QUESTION: {standalone_question}---")
-    return {"question": standalone_question}
+    return {"question": standalone_question, "standalone_question": standalone_question}
+
+def answer_router(state: GraphState):
+    """Skip the RAG pipeline entirely on an answer cache hit"""
+    if state.get("status") == "cached":
+        return "end"
+    return "retrieval"
 
 # --- RETRIEVAL: Hybrid + Rerank ---
+def bm25_from_documents(documents: List[Document]):
+    if not documents:
+        return None
+    with stage("bm25_build"):
+        bm25_retriever = BM25Retriever.from_documents(documents)
+    bm25_retriever.k = RETRIEVAL_TOP_K
+    return bm25_retriever
+
+def build_bm25_retriever(vector_store, product_id: Optional[int]):
+    """BM25 over every stored chunk of the product (or all chunks); None if there are none."""
+    if product_id and RESIDENCY_ENABLED:
+        # Built once per product and kept in memory until evicted or re-indexed. The copy shares
+        # the index but takes the current top_k, which may have changed since the load
+        bm25_retriever = residency_manager.warm(product_id, vector_store).bm25
+        return bm25_retriever.model_copy(update={"k": RETRIEVAL_TOP_K}) if bm25_retriever else None
+
+    contents = vector_store.get()
+    all_docs = contents["documents"]
+    all_meta = contents["metadatas"]
+    
+    docs_objects = []
+    if all_docs:
+        # Chunk ids are kept so BM25 hits are logged like vector hits (sessions.document_ids)
+        for res_id, res_text, res_meta in zip(contents["ids"], all_docs, all_meta):
+            # Filter by product_id if specified
+            if product_id:
+                if res_meta.get("product_id") == product_id:
+                    docs_objects.append(Document(page_content=res_text, metadata=res_meta, id=res_id))
+            else:
+                docs_objects.append(Document(page_content=res_text, metadata=res_meta, id=res_id))
+    
+    return bm25_from_documents(docs_objects)
+
 def retrieve_documents(state: GraphState):
     print("---RETRIEVE---")
     question = state["question"]
     product_id = state.get("product_id")
     
+    fast = state.get("mode") == "fast"
+    
+    cache_key = ("vector", product_id, question, RETRIEVAL_TOP_K) if fast else ("hybrid", product_id, question, RETRIEVAL_TOP_K, BM25_WEIGHT)
+    cached = retrieval_cache.get(cache_key)
+    if cached is not None:
+        print("---RETRIEVAL CACHE HIT---")
+        return {"documents": cached, "status": "retrieved"}
+    
     # 1. Vector Search with product filter
     vector_store = get_vector_store()
     
@@ -165,36 +344,100 @@ def retrieve_documents(state: GraphState):
         search_kwargs={"k": RETRIEVAL_TOP_K, "filter": filter_dict} if filter_dict else {"k": RETRIEVAL_TOP_K}
     )
     
-    # 2. BM25 - filter by product_id in metadata
-    all_docs = vector_store.get()["documents"]
-    all_meta = vector_store.get()["metadatas"]
-    
-    docs_objects = []
-    if all_docs:
-        for res_text, res_meta in zip(all_docs, all_meta):
-            # Filter by product_id if specified
-            if product_id:
-                if res_meta.get("product_id") == product_id:
-                    docs_objects.append(Document(page_content=res_text, metadata=res_meta))
-            else:
-                docs_objects.append(Document(page_content=res_text, metadata=res_meta))
-    
-    if not docs_objects:
-        bm25_retriever = None
-    else:
-        bm25_retriever = BM25Retriever.from_documents(docs_objects)
-        bm25_retriever.k = RETRIEVAL_TOP_K
+    # 2. BM25 - filter by product_id in metadata (skipped in fast mode)
+    bm25_retriever = None if fast else build_bm25_retriever(vector_store, product_id)
 
     # 3. Ensemble
     if bm25_retriever:
         ensemble_retriever = EnsembleRetriever(
             retrievers=[bm25_retriever, vector_retriever],
-            weights=[0.5, 0.5]
+            weights=[BM25_WEIGHT, 1 - BM25_WEIGHT]
         )
         docs = ensemble_retriever.invoke(question)
     else:
         docs = vector_retriever.invoke(question)
     
+    retrieval_cache.set(cache_key, docs)
+    return {"documents": docs, "status": "retrieved"}
+
+# --- MULTI-QUERY RETRIEVAL (one round instead of the rewrite loop) ---
+def generate_query_variants(question: str, count: int = MULTI_QUERY_COUNT) -> List[str]:
+    """One LLM call producing `count` reformulations; the original question always comes first."""
+    prompt = ChatPromptTemplate.from_template(
+        """You generate alternative phrasings of a user question to improve vectorstore retrieval 
+        over technical telecom documentation. Write {count} different versions of the question below, 
+        using different keywords and synonyms. Return one question per line, with no numbering and no other text.
+        Question: {question}"""
+    )
+    output = invoke_role("rewriter", prompt, {"question": question, "count": count})
+    
+    variants = [question]
+    for line in output.splitlines():
+        line = re.sub(r"^\s*(?:\d+[.)]|[-*•])\s*", "", line).strip()
+        if line and line.lower() not in {v.lower() for v in variants}:
+            variants.append(line)
+    return variants[:count + 1]
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Document]], weights: List[float], c: int = 60) -> List[Document]:
+    """Weighted RRF over several ranked lists, deduplicated by content (same scheme as EnsembleRetriever)."""
+    scores: Dict[str, float] = {}
+    docs_by_content: Dict[str, Document] = {}
+    for docs, weight in zip(ranked_lists, weights):
+        for rank, doc in enumerate(docs):
+            scores[doc.page_content] = scores.get(doc.page_content, 0.0) + weight / (rank + 1 + c)
+            docs_by_content.setdefault(doc.page_content, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs_by_content[content] for content in ranked]
+
+def _vector_search_many(vector_store, queries: List[str], filter_dict: Optional[Dict[str, Any]]) -> List[List[Document]]:
+    # One embedding request for all variants, then the searches run side by side
+    embeddings = vector_store.embeddings.embed_documents(queries)
+    if hasattr(vector_store, "batch_similarity_search_by_vectors"):
+        results = vector_store.batch_similarity_search_by_vectors(embeddings, k=RETRIEVAL_TOP_K, filter=filter_dict)
+        return [[doc for doc, _ in hits] for hits in results]
+    with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, vector_store.similarity_search_by_vector, embedding, k=RETRIEVAL_TOP_K, filter=filter_dict)
+            for embedding in embeddings
+        ]
+        return [future.result() for future in futures]
+
+def multi_query_retrieve(state: GraphState):
+    if state.get("mode") == "fast":
+        return retrieve_documents(state)
+    print("---MULTI-QUERY RETRIEVE---")
+    question = state["question"]
+    product_id = state.get("product_id")
+    
+    cache_key = ("multi", product_id, question, RETRIEVAL_TOP_K, BM25_WEIGHT, MULTI_QUERY_COUNT)
+    cached = retrieval_cache.get(cache_key)
+    if cached is not None:
+        print("---RETRIEVAL CACHE HIT---")
+        return {"documents": cached, "status": "retrieved"}
+    
+    vector_store = get_vector_store()
+    filter_dict = {"product_id": product_id} if product_id else None
+    
+    # Variant generation (LLM) and the BM25 build are independent - overlap them. Each runs in a
+    # copy of this context so the active profile and the graph's callbacks follow it
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        variants_future = pool.submit(contextvars.copy_context().run, generate_query_variants, question)
+        bm25_future = pool.submit(contextvars.copy_context().run, build_bm25_retriever, vector_store, product_id)
+        variants = variants_future.result()
+        bm25_retriever = bm25_future.result()
+    print(f"---QUERY VARIANTS: {variants}---")
+    
+    ranked_lists, weights = [], []
+    for docs in _vector_search_many(vector_store, variants, filter_dict):
+        ranked_lists.append(docs)
+        weights.append(1 - BM25_WEIGHT if bm25_retriever else 1.0)
+    if bm25_retriever:
+        for variant in variants:
+            ranked_lists.append(bm25_retriever.invoke(variant))
+            weights.append(BM25_WEIGHT)
+    
+    docs = reciprocal_rank_fusion(ranked_lists, weights)[:MULTI_QUERY_MAX_DOCS]
+    retrieval_cache.set(cache_key, docs)
     return {"documents": docs, "status": "retrieved"}
 
 # --- GRADER (Corrective) ---
@@ -220,12 +463,9 @@ def grade_documents(state: GraphState):
         Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question."""
     )
     
-    # Structured output for grader
-    # For local LLMs without forced tool calling, we use JSON parsing or simple string check
-    chain = prompt | llm | StrOutputParser()
-    
+    # For local LLMs without forced tool calling, we use a simple string check
     for d in documents:
-        score = chain.invoke({"question": question, "document": d.page_content})
+        score = invoke_role("grader", prompt, {"question": question, "document": d.page_content}, confident=is_binary_verdict)
         if "yes" in score.lower():
             filtered_docs.append(d)
         else:
@@ -246,13 +486,19 @@ def generate(state: GraphState):
     print("---GENERATE---")
     question = state["question"]
     documents = state["documents"]
-    chat_history = state.get("chat_history", [])
+    chat_history = history_with_summary(state.get("chat_history", []), state.get("summary"))
+    
+    # Small-to-big: swap child hits for their (deduplicated) parent sections within the budget
+    context_docs = expand_to_parents(documents, CONTEXT_TOKEN_BUDGET) if documents else []
     
     # Check if we have relevant documents
-    has_documents = bool(documents)
+    has_documents = bool(context_docs)
     
-    # Format context from documents
-    context = "\n\n".join([doc.page_content for doc in documents]) if documents else ""
+    # Format context from documents, tagged with their source so answers can cite them
+    context = "\n\n".join(
+        f"{doc.page_content}\n(Source: {os.path.basename(doc.metadata.get('source', 'Unknown'))}, Page: {doc.metadata.get('page', 0) + 1})"
+        for doc in context_docs
+    ) if context_docs else ""
     
     # Dynamic system prompt based on whether we have context
     if has_documents:
@@ -285,8 +531,7 @@ Be friendly, professional, and helpful. If the user is asking about specific pro
         ("human", "{question}")
     ])
     
-    chain = prompt | llm | StrOutputParser()
-    generation = chain.invoke({
+    generation = invoke_role("answer", prompt, {
         "context": context,
         "chat_history": chat_history,
         "question": question
@@ -295,176 +540,40 @@ Be friendly, professional, and helpful. If the user is asking about specific pro
     # Programmatically append sources - REMOVED per user request
     # generation = generation.strip() + format_sources_footer(documents)
     
+    cache_key = answer_cache_key(state, state.get("standalone_question") or question)
+    if cache_key:
+        answer_cache.set(cache_key, (generation, documents))
+    
     return {"generation": generation, "status": "generated"}
 
-# --- STREAMING GENERATE WITH STATUS EVENTS (for SSE) ---
-# --- STREAMING GENERATE WITH STATUS EVENTS (for SSE) ---
-async def stream_generate_with_status(question: str, product_id: Optional[int], chat_history: List[BaseMessage], image: Optional[str] = None):
-    """
-    Async generator that streams BOTH status updates AND LLM tokens.
-    Yields JSON-like tuples: (event_type, content)
-      - ("status", "SCANNING DATABASE SECTORS...")
-      - ("token", "G9 is a...")
-    """
-    print("---STREAM GENERATE WITH STATUS---")
-    
-    # Status 1: Analyzing
-    yield ("status", "INITIALIZING QUERY PROTOCOL...")
-    
-    # Check if image is present - if so, use Vision Model
-    if image:
-        yield ("status", "ANALYZING VISUAL DATA...")
-        
-        # Use Vision Model
-        vision_llm = ChatOllama(model=VISION_MODEL, temperature=0, base_url=OLLAMA_BASE_URL, keep_alive=OLLAMA_KEEP_ALIVE)
-        
-        system_prompt = """You are Orion, an expert Telecom Support Assistant with visual analysis capabilities.
+def grade_router(state: GraphState):
+    """Fast mode skips grading (and therefore rewrites) entirely"""
+    if state.get("mode") == "fast":
+        return "generate"
+    return "grader"
+
+# --- VISION ---
+def vision_generate(state: GraphState):
+    """Answer about a user-supplied image with the vision model (no retrieval)."""
+    print("---VISION GENERATE---")
+    system_prompt = """You are Orion, an expert Telecom Support Assistant with visual analysis capabilities.
 You are analyzing an image provided by the user.
 - Identification: Identify the device, component, or interface shown.
 - Diagnostics: Look for error codes, LED patterns, or physical damage.
 - Context: Use the user's question to guide your analysis.
 - Tone: Professional, technical, and precise.
 """
-        # Construct multimodal message
-        # image should be a base64 data string (e.g., "data:image/png;base64,...")
-        # Ensure we just send the base64 part if expected, BUT langchain-ollama usually handles the data URI format fine or expects base64.
-        # Ollama API expects base64 string in 'images' field. LangChain handles this mapping.
-        # We will assume 'image' is the full data URI or base64. LangChain's HumanMessage with image_url handles data URIs.
-        
-        message = HumanMessage(
-            content=[
-                {"type": "text", "text": question},
-                {"type": "image_url", "image_url": image},
-            ]
-        )
-        
-        messages = [
-            SystemMessage(content=system_prompt),
-            message
+    # image is a data URI or raw base64; LangChain maps image_url content to Ollama's `images` field
+    message = HumanMessage(
+        content=[
+            {"type": "text", "text": state["question"]},
+            {"type": "image_url", "image_url": state["image"]},
         ]
-        
-        yield ("status", "GENERATING DIAGNOSTIC REPORT...")
-        
-        async for chunk in vision_llm.astream(messages):
-            if chunk.content:
-                yield ("token", chunk.content)
-        
-        yield ("status", "TRANSMISSION COMPLETE")
-        return  # End stream here for vision path
-    
-    # 1. Contextualize if there's history
-    if chat_history:
-        yield ("status", "PROCESSING CONVERSATION CONTEXT...")
-        contextualize_prompt = ChatPromptTemplate.from_messages([
-            ("system", """Given a chat history and the latest user question which might reference context 
-in the chat history, formulate a standalone question which can be understood without the chat history. 
-Do NOT answer the question, just reformulate it if needed and otherwise return it as is."""),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{question}")
-        ])
-        chain = contextualize_prompt | llm | StrOutputParser()
-        question = chain.invoke({"chat_history": chat_history, "question": question})
-        print(f"---CONTEXTUALIZED: {question}---")
-    
-    # Status 2: Searching
-    yield ("status", "SCANNING DATABASE SECTORS...")
-    
-    # 2. Retrieve documents
-    vector_store = get_vector_store()
-    filter_dict = {"product_id": product_id} if product_id else None
-    
-    vector_retriever = vector_store.as_retriever(
-        search_kwargs={"k": RETRIEVAL_TOP_K, "filter": filter_dict} if filter_dict else {"k": RETRIEVAL_TOP_K}
     )
-    documents = vector_retriever.invoke(question)
-    doc_count = len(documents)
-    print(f"---RETRIEVED {doc_count} DOCUMENTS---")
-    
-    # Status 3: Documents found
-    if doc_count > 0:
-        yield ("status", f"DOCUMENTS LOCATED: {doc_count} MATCHES")
-        
-        # Extract sources
-        seen_sources = set()
-        sources_list = []
-        for doc in documents:
-            source = doc.metadata.get("source", "Unknown Document")
-            # Clean up filename (remove path)
-            filename = os.path.basename(source)
-            page = doc.metadata.get("page", 0) + 1  # 0-indexed usually
-            
-            identifier = f"{filename}-{page}"
-            if identifier not in seen_sources:
-                seen_sources.add(identifier)
-                sources_list.append({"filename": filename, "page": page})
-        
-        # Yield sources event
-        if sources_list:
-            import json
-            yield ("sources", json.dumps(sources_list))
-            
-    else:
-        yield ("status", "NO MATCHING RECORDS FOUND")
-    
-    # Status 4: Generating
-    yield ("status", "GENERATING RESPONSE SEQUENCE...")
-    
-    # 3. Build context and prompt
-    has_documents = bool(documents)
-    # context = "\n\n".join([doc.page_content for doc in documents]) if documents else ""
-    context_parts = []
-    if documents:
-        for doc in documents:
-            source = os.path.basename(doc.metadata.get("source", "Unknown"))
-            page = doc.metadata.get("page", 0) + 1
-            context_parts.append(f"{doc.page_content}\n(Source: {source}, Page: {page})")
-    context = "\n\n".join(context_parts)
-    
-    if has_documents:
-        system_prompt = f"""You are Orion, an expert Telecom Support Assistant. 
-You have access to relevant documentation to answer the user's question.
-
-Use the following context from documents to answer:
-{context}
-
-Guidelines:
-- Answer based on the provided context
-- Be concise but thorough
-- If the context doesn't contain the answer, say so clearly
-- Use conversation history for follow-up questions"""
-    else:
-        system_prompt = """You are Orion, an expert Telecom Support Assistant.
-
-No relevant documents were found for this query. However, you can still:
-- Provide general telecom knowledge from your training
-- Ask clarifying questions to help the user find what they need
-- Explain what types of documents or questions you can help with
-
-Be friendly, professional, and helpful."""
-    
-    # 4. Stream the LLM response
-    
-    messages = [SystemMessage(content=system_prompt)]
-    messages.extend(chat_history)
-    messages.append(HumanMessage(content=question))
-    
-    # Use streaming with Ollama
-    streaming_llm = ChatOllama(model=LLM_MODEL, temperature=0, base_url=OLLAMA_BASE_URL, keep_alive=OLLAMA_KEEP_ALIVE)
-    
-    async for chunk in streaming_llm.astream(messages):
-        if chunk.content:
-            yield ("token", chunk.content)
-            
-    # Programmatically append sources
-    # Programmatically append sources - REMOVED per user request
-    # yield ("token", format_sources_footer(documents))
-    
-    # Final status
-    yield ("status", "TRANSMISSION COMPLETE")
+    response = get_vision_llm().invoke([SystemMessage(content=system_prompt), message])
+    return {"generation": response.content, "documents": [], "status": "generated"}
 
 # --- ROUTER / REWRITE ---
-MAX_REWRITES = 2  # Maximum number of query rewrites before giving up
-
 def retrieval_grader(state: GraphState):
     # Conditional edge logic
     rewrite_count = state.get("rewrite_count", 0)
@@ -491,57 +600,165 @@ def rewrite_query(state: GraphState):
         Improved Question:"""
     )
     
-    chain = prompt | llm | StrOutputParser()
-    better_question = chain.invoke({"question": question})
+    better_question = invoke_role(
+        "rewriter", prompt, {"question": question},
+        confident=lambda output: is_reformulation(output, question),
+    )
     
     # Increment rewrite count and reset web_search flag
     return {"question": better_question, "web_search": "No", "rewrite_count": rewrite_count + 1}
 
-# --- VISUAL (Placeholder for Logic) ---
-# If vision needed, we would add another node. For now, we integrate Llama Vision if image path is detected?
-# For text-based RAG, we stick to above.
-
 # --- GRAPH ---
-workflow = StateGraph(GraphState)
-
-# Define Nodes
-workflow.add_node("classify_intent", classify_intent)  # NEW: First node - intent classification
-workflow.add_node("greeting_response", greeting_response)  # NEW: Direct response for greetings
-workflow.add_node("contextualize", contextualize_question)
-workflow.add_node("retrieval", retrieve_documents)
-workflow.add_node("grader", grade_documents)
-workflow.add_node("generate", generate)
-workflow.add_node("rewrite", rewrite_query)
-
-# Build Graph - Start with intent classification
-workflow.set_entry_point("classify_intent")
-
-# Route based on intent
-workflow.add_conditional_edges(
-    "classify_intent",
-    intent_router,
-    {
-        "greeting_response": "greeting_response",
-        "contextualize": "contextualize",
-    },
-)
-
-# Greeting path goes directly to END
-workflow.add_edge("greeting_response", END)
-
-# Question path goes through RAG pipeline
-workflow.add_edge("contextualize", "retrieval")
-workflow.add_edge("retrieval", "grader")
-workflow.add_conditional_edges(
-    "grader",
-    retrieval_grader,
-    {
-        "rewrite": "rewrite",
-        "generate": "generate",
-    },
-)
-workflow.add_edge("rewrite", "retrieval")  # Loop back
-workflow.add_edge("generate", END)
-
-app_graph = workflow.compile()
+def build_graph(retrieval_mode: str = RETRIEVAL_MODE):
+    """
+    retrieval_mode "rewrite" loops rewrite -> retrieval -> grader up to MAX_REWRITES times;
+    "multi_query" retrieves for several variants at once and grades a single time.
+    """
+    multi_query = retrieval_mode == "multi_query"
+    workflow = StateGraph(GraphState)
+
+    # Define Nodes
+    workflow.add_node("classify_intent", classify_intent)  # NEW: First node - intent classification
+    workflow.add_node("greeting_response", greeting_response)  # NEW: Direct response for greetings
+    workflow.add_node("vision", timed("vision", vision_generate))
+    workflow.add_node("contextualize", timed("contextualize", contextualize_question))
+    workflow.add_node("retrieval", timed("retrieval", multi_query_retrieve if multi_query else retrieve_documents))
+    workflow.add_node("grader", timed("grader", grade_documents))
+    workflow.add_node("generate", timed("generate", generate))
+    if not multi_query:
+        workflow.add_node("rewrite", timed("rewrite", rewrite_query))
+
+    # Build Graph - Start with intent classification
+    workflow.set_entry_point("classify_intent")
+
+    # Route based on intent
+    workflow.add_conditional_edges(
+        "classify_intent",
+        intent_router,
+        {
+            "greeting_response": "greeting_response",
+            "vision": "vision",
+            "contextualize": "contextualize",
+        },
+    )
+
+    # Greeting and vision paths go directly to END
+    workflow.add_edge("greeting_response", END)
+    workflow.add_edge("vision", END)
+
+    # Question path goes through RAG pipeline
+    workflow.add_conditional_edges(
+        "contextualize",
+        answer_router,
+        {
+            "retrieval": "retrieval",
+            "end": END,
+        },
+    )
+    workflow.add_conditional_edges(
+        "retrieval",
+        grade_router,
+        {
+            "grader": "grader",
+            "generate": "generate",
+        },
+    )
+    if multi_query:
+        # Bounded at one round: whatever survives grading goes to generate
+        workflow.add_edge("grader", "generate")
+    else:
+        workflow.add_conditional_edges(
+            "grader",
+            retrieval_grader,
+            {
+                "rewrite": "rewrite",
+                "generate": "generate",
+            },
+        )
+        workflow.add_edge("rewrite", "retrieval")  # Loop back
+    workflow.add_edge("generate", END)
+
+    return workflow.compile()
+
+@lru_cache(maxsize=None)
+def get_app_graph(retrieval_mode: str = RETRIEVAL_MODE):
+    """Compile the graph once per retrieval mode, on first use."""
+    return build_graph(retrieval_mode)
+
+# --- EVENT STREAMING (SSE) ---
+NODE_STATUS = {
+    "classify_intent": "INITIALIZING QUERY PROTOCOL...",
+    "greeting_response": "GREETING PROTOCOL INITIATED...",
+    "vision": "ANALYZING VISUAL DATA...",
+    "contextualize": "PROCESSING CONVERSATION CONTEXT...",
+    "retrieval": "SCANNING DATABASE SECTORS...",
+    "grader": "VERIFYING DOCUMENT RELEVANCE...",
+    "rewrite": "REFINING QUERY PARAMETERS...",
+    "generate": "GENERATING RESPONSE SEQUENCE...",
+}
+# Only tokens from these nodes are answer text; grader/rewriter/contextualizer output stays internal
+ANSWER_NODES = {"generate", "vision"}
+
+def _sources(documents: List[Document]) -> List[Dict[str, Any]]:
+    seen = set()
+    sources = []
+    for doc in documents:
+        filename = os.path.basename(doc.metadata.get("source", "Unknown Document"))
+        page = doc.metadata.get("page", 0) + 1  # 0-indexed usually
+        if (filename, page) not in seen:
+            seen.add((filename, page))
+            sources.append({"filename": filename, "page": page})
+    return sources
+
+async def stream_graph_events(inputs: Dict[str, Any], retrieval_mode: str = RETRIEVAL_MODE, config: Optional[dict] = None):
+    """
+    Run the compiled graph with LangGraph's async event stream.
+    Yields (event_type, content) tuples:
+      - ("status", "SCANNING DATABASE SECTORS...") when a node starts / retrieval finishes
+      - ("sources", json list) right before generation
+      - ("token", "G9 is a...") answer tokens from the generate/vision nodes
+      - ("final", state) once, at the end, with the merged final graph state
+    Answers that were not produced by an LLM (greetings, cache hits) are emitted as word tokens.
+    """
+    graph = get_app_graph(retrieval_mode)
+    final: Dict[str, Any] = dict(inputs)
+    streamed = False
+    has_history = bool(inputs.get("chat_history") or inputs.get("summary"))
+    
+    async for event in graph.astream_events(inputs, config=config, version="v2"):
+        kind = event["event"]
+        node = event.get("metadata", {}).get("langgraph_node")
+        is_node_event = node is not None and event["name"] == node
+        
+        if kind == "on_chain_start" and is_node_event:
+            if node in NODE_STATUS and (node != "contextualize" or has_history):
+                yield ("status", NODE_STATUS[node])
+            if node == "generate" and final.get("documents"):
+                yield ("sources", json.dumps(_sources(final["documents"])))
+        
+        elif kind == "on_chain_end" and is_node_event:
+            output = event["data"].get("output")
+            if isinstance(output, dict):
+                final.update(output)
+            if node == "retrieval":
+                doc_count = len(final.get("documents") or [])
+                yield ("status", f"DOCUMENTS LOCATED: {doc_count} MATCHES" if doc_count else "NO MATCHING RECORDS FOUND")
+        
+        elif kind == "on_chat_model_stream" and node in ANSWER_NODES:
+            content = event["data"]["chunk"].content
+            if content:
+                streamed = True
+                yield ("token", content)
+    
+    if not streamed and final.get("generation"):
+        for word in re.findall(r"\S+\s*", final["generation"]):
+            yield ("token", word)
+    
+    yield ("status", "TRANSMISSION COMPLETE")
+    yield ("final", final)
 
+def __getattr__(name: str):
+    # Keep `from rag_graph import app_graph` working without compiling at import time
+    if name == "app_graph":
+        return get_app_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,104 @@
+from typing import List, Optional, Set, Tuple
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import Product, DocumentRegistry, ParentChunk
+
+# --- CONFIG ---
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def _page(rows: list, limit: int):
+    """Trim the look-ahead row; the cursor for the next page is the last id returned."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (rows[-1].id if has_more else None)
+
+# --- LISTING (keyset pagination on the primary key) ---
+async def list_products(db: AsyncSession, limit: int = PAGE_SIZE, after: Optional[int] = None) -> dict:
+    query = select(Product).order_by(Product.id).limit(limit + 1)
+    if after is not None:
+        query = query.where(Product.id > after)
+    rows, next_cursor = _page((await db.execute(query)).scalars().all(), limit)
+
+    counts = {}
+    if rows:
+        # Document counts for this page only, answered from the product_id index
+        count_query = (
+            select(DocumentRegistry.product_id, func.count())
+            .where(DocumentRegistry.product_id.in_([p.id for p in rows]))
+            .group_by(DocumentRegistry.product_id)
+        )
+        counts = dict((await db.execute(count_query)).all())
+    total = (await db.execute(select(func.count()).select_from(Product))).scalar_one()
+    return {
+        "items": [{"id": p.id, "name": p.name, "document_count": counts.get(p.id, 0)} for p in rows],
+        "total": total,
+        "next_cursor": next_cursor,
+    }
+
+def _document_filters(product_id: Optional[int] = None, status: Optional[str] = None, ids: Optional[List[int]] = None):
+    filters = []
+    if product_id is not None:
+        filters.append(DocumentRegistry.product_id == product_id)
+    if status is not None:
+        filters.append(DocumentRegistry.status == status)
+    if ids is not None:
+        filters.append(DocumentRegistry.id.in_(ids))
+    return filters
+
+async def list_documents(db: AsyncSession, product_id: int, limit: int = PAGE_SIZE, after: Optional[int] = None, status: Optional[str] = None) -> dict:
+    filters = _document_filters(product_id, status)
+    # Only the listed columns; metadata_info can be large and is not shown
+    query = (
+        select(DocumentRegistry.id, DocumentRegistry.filename, DocumentRegistry.upload_date, DocumentRegistry.status)
+        .where(*filters)
+        .order_by(DocumentRegistry.id)
+        .limit(limit + 1)
+    )
+    if after is not None:
+        query = query.where(DocumentRegistry.id > after)
+    rows, next_cursor = _page((await db.execute(query)).all(), limit)
+    total = (await db.execute(select(func.count()).select_from(DocumentRegistry).where(*filters))).scalar_one()
+    return {
+        "items": [
+            {
+                "id": d.id,
+                "filename": d.filename,
+                "upload_date": d.upload_date.isoformat() if d.upload_date else None,
+                "status": d.status,
+            }
+            for d in rows
+        ],
+        "total": total,
+        "next_cursor": next_cursor,
+    }
+
+# --- BULK OPERATIONS (one statement per table, no per-row ORM work) ---
+async def selected_files(db: AsyncSession, product_id: Optional[int] = None, status: Optional[str] = None, ids: Optional[List[int]] = None) -> Set[Tuple[Optional[int], str]]:
+    """(product_id, file_hash) of the selected documents, for cleaning up the index after a delete."""
+    query = select(DocumentRegistry.product_id, DocumentRegistry.file_hash).where(*_document_filters(product_id, status, ids))
+    return set((await db.execute(query)).tuples().all())
+
+async def delete_documents(db: AsyncSession, product_id: Optional[int] = None, status: Optional[str] = None, ids: Optional[List[int]] = None) -> int:
+    """Delete the selected documents and their parent sections; the caller commits."""
+    filters = _document_filters(product_id, status, ids)
+    if not filters:
+        raise ValueError("Select documents by ids, product_id or status")
+    hashes = select(DocumentRegistry.file_hash).where(*filters)
+    await db.execute(delete(ParentChunk).where(ParentChunk.file_hash.in_(hashes)))
+    result = await db.execute(delete(DocumentRegistry).where(*filters))
+    return result.rowcount
+
+async def update_document_status(db: AsyncSession, new_status: str, product_id: Optional[int] = None, status: Optional[str] = None, ids: Optional[List[int]] = None) -> int:
+    filters = _document_filters(product_id, status, ids)
+    if not filters:
+        raise ValueError("Select documents by ids, product_id or status")
+    result = await db.execute(update(DocumentRegistry).where(*filters).values(status=new_status))
+    return result.rowcount
+
+async def delete_product(db: AsyncSession, product_id: int) -> int:
+    """Delete a product with all of its documents and parent sections; the caller commits."""
+    deleted = await delete_documents(db, product_id=product_id)
+    await db.execute(delete(ParentChunk).where(ParentChunk.product_id == product_id))
+    await db.execute(delete(Product).where(Product.id == product_id))
+    return deleted
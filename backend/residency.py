@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from langchain_core.documents import Document
+from profiling import stage
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- CONFIG ---
+RESIDENCY_ENABLED = os.getenv("RESIDENCY_ENABLED", "True").lower() == "true"
+RESIDENCY_MEMORY_MB = int(os.getenv("RESIDENCY_MEMORY_MB", 512))  # Budget across all resident products
+
+class ResidentProduct:
+    """Everything retrieval needs for one product, held in memory."""
+
+    def __init__(self, product_id: int, chunks: List[Document], bm25, parents: Dict[str, Document], vector_store, heap_bytes: int, vector_bytes: int, load_s: float):
+        self.product_id = product_id
+        self.chunks = chunks
+        self.bm25 = bm25
+        self.parents = parents
+        self.vector_store = vector_store
+        self.heap_bytes = heap_bytes
+        self.vector_bytes = vector_bytes
+        self.load_s = load_s
+        self.size_bytes = heap_bytes + vector_bytes
+
+    def to_dict(self) -> dict:
+        return {
+            "product_id": self.product_id,
+            "chunks": len(self.chunks),
+            "parents": len(self.parents),
+            "size_mb": round(self.size_bytes / 2**20, 2),
+            "heap_mb": round(self.heap_bytes / 2**20, 2),
+            "vector_mb": round(self.vector_bytes / 2**20, 2),
+            "load_s": round(self.load_s, 3),
+        }
+
+# Heap cost of a resident product, calibrated once with tracemalloc over Documents plus
+# BM25Retriever.from_documents (500-5000 chunks of 40-250 words; fit within 15%, within 5% from
+# 2000 chunks up). Text sizes alone underestimate a product by an order of magnitude: BM25 keeps
+# a token list and a term-frequency dict per chunk, and every Document carries its own metadata.
+CHUNK_OVERHEAD_BYTES = 1850  # Document, metadata dict and BM25 per-chunk structures
+CHUNK_TEXT_FACTOR = 12  # Heap bytes per byte of chunk text, mostly BM25 tokens
+PARENT_OVERHEAD_BYTES = 500
+PARENT_TEXT_FACTOR = 1  # Parent texts are only decompressed and kept as-is
+
+def _estimate_heap_bytes(chunks: List[Document], parents: Dict[str, Document]) -> int:
+    return (
+        len(chunks) * CHUNK_OVERHEAD_BYTES
+        + CHUNK_TEXT_FACTOR * sum(len(chunk.page_content.encode("utf-8")) for chunk in chunks)
+        + len(parents) * PARENT_OVERHEAD_BYTES
+        + PARENT_TEXT_FACTOR * sum(len(parent.page_content.encode("utf-8")) for parent in parents.values())
+    )
+
+def _load_product(product_id: int, vector_store) -> ResidentProduct:
+    from database import SessionLocal, ParentChunk
+    from rag_graph import bm25_from_documents
+
+    t0 = time.perf_counter()
+    contents = vector_store.get(where={"product_id": product_id})
+    chunks = [
+        Document(page_content=text, metadata=metadata or {}, id=doc_id)
+        for doc_id, text, metadata in zip(contents["ids"], contents["documents"], contents["metadatas"])
+    ]
+
+    db = SessionLocal()
+    try:
+        rows = db.query(ParentChunk).filter(ParentChunk.product_id == product_id).all()
+        parents = {
+            row.id: Document(page_content=zlib.decompress(row.content).decode("utf-8"), metadata=row.metadata_info or {})
+            for row in rows
+        }
+    finally:
+        db.close()
+    bm25 = bm25_from_documents(chunks)
+
+    # The numpy store can hold a segment in RAM; Chroma manages its own index memory
+    vector_bytes = vector_store.pin_segment(product_id) if hasattr(vector_store, "pin_segment") else 0
+    heap_bytes = _estimate_heap_bytes(chunks, parents)
+    return ResidentProduct(product_id, chunks, bm25, parents, vector_store, heap_bytes, vector_bytes, time.perf_counter() - t0)
+
+def _release_product(resident: ResidentProduct):
+    if hasattr(resident.vector_store, "unpin_segment"):
+        resident.vector_store.unpin_segment(resident.product_id)
+
+class ResidencyManager:
+    """
+    Keeps the retrieval structures of recently used products in memory (chunk texts, BM25,
+    parent sections and, on the numpy backend, the vector segment) within a memory budget,
+    evicting the least recently used product first.
+    """
+
+    def __init__(self, budget_bytes: int = RESIDENCY_MEMORY_MB * 2**20):
+        self.budget_bytes = budget_bytes
+        self._products: "OrderedDict[int, ResidentProduct]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[int, threading.Lock] = {}
+        # Bumped by invalidate() so a load racing with it is not kept: per product, or the epoch for all
+        self._epoch = 0
+        self._generations: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, product_id: int) -> Optional[ResidentProduct]:
+        with self._lock:
+            resident = self._products.get(product_id)
+            if resident is not None:
+                self._products.move_to_end(product_id)
+            return resident
+
+    def warm(self, product_id: int, vector_store=None) -> ResidentProduct:
+        """
+        Return the resident product, loading it first if needed (one load per product at a time).
+        A load reads from `vector_store` (the configured store when omitted).
+        """
+        resident = self.get(product_id)
+        if resident is not None:
+            self.hits += 1
+            return resident
+        with self._lock:
+            load_lock = self._loading.setdefault(product_id, threading.Lock())
+        with load_lock:
+            resident = self.get(product_id)
+            if resident is not None:
+                self.hits += 1
+                return resident
+            self.misses += 1
+            generation = self._generation_of(product_id)
+            if vector_store is None:
+                from chroma_utils import get_vector_store
+                vector_store = get_vector_store()
+            with stage("residency_load"):
+                resident = _load_product(product_id, vector_store)
+            with self._lock:
+                stale = generation != self._generation_of(product_id)
+                if not stale:
+                    self._products[product_id] = resident
+                    evicted = self._evict(keep=product_id)
+            if stale:
+                # Invalidated while loading: serve this request from the load, then let it go
+                _release_product(resident)
+                return resident
+            for old in evicted:
+                _release_product(old)
+            print(f"---RESIDENCY: PRODUCT {product_id} LOADED ({resident.to_dict()['size_mb']} MB in {resident.load_s:.2f}s)---")
+            return resident
+
+    def _generation_of(self, product_id: int) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(product_id, 0)
+
+    def _evict(self, keep: int) -> List[ResidentProduct]:
+        evicted = []
+        while sum(r.size_bytes for r in self._products.values()) > self.budget_bytes:
+            oldest = next(iter(self._products))
+            if oldest == keep:
+                break  # A product larger than the budget still stays resident while it is in use
+            evicted.append(self._products.pop(oldest))
+            self.evictions += 1
+        return evicted
+
+    def invalidate(self, product_id: Optional[int] = None):
+        """Drop one product (or all) after its index changed; the next warm() reloads it."""
+        with self._lock:
+            if product_id is None:
+                self._epoch += 1
+                dropped = list(self._products.values())
+                self._products.clear()
+            else:
+                self._generations[product_id] = self._generations.get(product_id, 0) + 1
+                resident = self._products.pop(product_id, None)
+                dropped = [resident] if resident else []
+        for resident in dropped:
+            _release_product(resident)
+
+    def parents(self, parent_ids: Iterable[str]) -> Dict[str, Document]:
+        """Parent sections found among resident products."""
+        found = {}
+        with self._lock:
+            residents = list(self._products.values())
+        for parent_id in parent_ids:
+            for resident in residents:
+                if parent_id in resident.parents:
+                    found[parent_id] = resident.parents[parent_id]
+                    break
+        return found
+
+    def stats(self) -> dict:
+        with self._lock:
+            products = [r.to_dict() for r in self._products.values()]
+        return {
+            "enabled": RESIDENCY_ENABLED,
+            "budget_mb": round(self.budget_bytes / 2**20, 2),
+            "used_mb": round(sum(p["size_mb"] for p in products), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "products": products,
+        }
+
+residency_manager = ResidencyManager()
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- CONFIG ---
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", 1000))  # LRU bound on live sessions
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", 3600))  # Idle sessions expire after this
+SESSION_HISTORY_WINDOW = int(os.getenv("SESSION_HISTORY_WINDOW", 6))  # Messages kept verbatim; older ones are summarized
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", 50))  # Turn records kept per session
+
+def document_ids(documents: Optional[List[Document]]) -> List[str]:
+    ids = []
+    for doc in documents or []:
+        doc_id = getattr(doc, "id", None) or doc.metadata.get("file_hash")
+        if doc_id:
+            ids.append(doc_id)
+    return ids
+
+class ChatSession:
+    """One conversation: a verbatim window of recent messages, a summary of the rest, and per-turn cache."""
+
+    def __init__(self, session_id: str, product_id: Optional[int] = None):
+        self.id = session_id
+        self.product_id = product_id
+        self.messages: List[BaseMessage] = []
+        self.summary = ""
+        self.turns: List[Dict[str, Any]] = []
+        self.last_access = time.monotonic()
+        self.lock = threading.Lock()
+        self.summarizing = False
+
+    def history(self):
+        """Return (recent messages, summary) snapshot for the graph."""
+        with self.lock:
+            return list(self.messages), self.summary
+
+    def cached_standalone(self, question: str) -> Optional[str]:
+        """Standalone question of the previous turn if the user re-asks it verbatim (retry/regenerate)."""
+        with self.lock:
+            if self.turns and self.turns[-1]["question"] == question:
+                return self.turns[-1]["standalone_question"]
+        return None
+
+    def record_turn(self, question: str, standalone_question: str, doc_ids: List[str], answer: str):
+        with self.lock:
+            self.messages.extend([HumanMessage(content=question), AIMessage(content=answer)])
+            self.turns.append({
+                "question": question,
+                "standalone_question": standalone_question,
+                "doc_ids": doc_ids,
+                "answer": answer,
+            })
+            del self.turns[:-SESSION_MAX_TURNS]
+
+    def needs_summary(self) -> bool:
+        with self.lock:
+            return len(self.messages) > SESSION_HISTORY_WINDOW and not self.summarizing
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "session_id": self.id,
+                "product_id": self.product_id,
+                "summary": self.summary,
+                "turns": list(self.turns),
+            }
+
+class SessionStore:
+    """Bounded in-memory session store with LRU eviction and idle TTL."""
+
+    def __init__(self, max_sessions: int = SESSION_MAX_SESSIONS, ttl_seconds: int = SESSION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_access <= self.ttl_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+
+    def create(self, product_id: Optional[int] = None) -> ChatSession:
+        session = ChatSession(uuid.uuid4().hex, product_id)
+        with self._lock:
+            self._sessions[session.id] = session
+            self._evict()
+        return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(session_id)
+            if session:
+                session.last_access = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+session_store = SessionStore()
+
+def fold_session_history(session: ChatSession):
+    """
+    Move messages that fell out of the window into the running summary.
+    Meant to run as a background task after the response has been sent.
+    """
+    from rag_graph import summarize_history
+
+    with session.lock:
+        if session.summarizing or len(session.messages) <= SESSION_HISTORY_WINDOW:
+            return
+        session.summarizing = True
+        overflow = session.messages[:-SESSION_HISTORY_WINDOW]
+        summary = session.summary
+    try:
+        new_summary = summarize_history(summary, overflow)
+        with session.lock:
+            session.summary = new_summary
+            # Messages appended meanwhile stay; only the folded prefix is dropped
+            session.messages = session.messages[len(overflow):]
+        print(f"---SESSION {session.id}: FOLDED {len(overflow)} MESSAGES INTO SUMMARY---")
+    except Exception as e:
+        print(f"---SESSION {session.id}: SUMMARY FAILED: {e}---")
+    finally:
+        session.summarizing = False
@@ -0,0 +1,340 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tarfile
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+from chroma_utils import (
+    EMBEDDING_MODEL,
+    VECTOR_BACKEND,
+    get_vector_store_path,
+    index_lock,
+    reset_vector_store_clients,
+)
+from database import SQLITE_DB_PATH, engine
+from caches import clear_result_caches
+from residency import residency_manager
+
+load_dotenv()
+
+# --- CONFIG ---
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "./data/snapshots")
+SNAPSHOT_INCLUDE_UPLOADS = os.getenv("SNAPSHOT_INCLUDE_UPLOADS", "False").lower() == "true"  # Original files are large and not needed to serve
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./data/uploads")
+
+SNAPSHOT_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+DB_NAME = "telecortex.db"
+VECTORS_DIR = "vectors"
+UPLOADS_DIR = "uploads"
+
+_VERSION_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+
+def _check_version(version: str) -> str:
+    if not _VERSION_RE.match(version):
+        raise ValueError(f"Invalid snapshot version: {version!r}")
+    return version
+
+def _new_version() -> str:
+    return f"{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}-{uuid.uuid4().hex[:6]}"
+
+def archive_path(version: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{_check_version(version)}.tar.gz")
+
+def _unpacked_path(version: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, _check_version(version))
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _checksums(root: str) -> Dict[str, str]:
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, root)
+            if rel != MANIFEST_NAME:
+                files[rel] = _sha256(path)
+    return files
+
+def _backup_sqlite(source: str, target: str):
+    # The backup API copies a consistent image even while other connections write
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+def _copy_tree(source: str, target: str):
+    if os.path.isdir(source):
+        shutil.copytree(source, target)
+    else:
+        os.makedirs(target)
+
+def _document_count(db_path: str) -> int:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM document_registry").fetchone()[0]
+    except sqlite3.Error:
+        return 0
+    finally:
+        conn.close()
+
+def _write_manifest(root: str, version: str, extra: Optional[dict] = None) -> dict:
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "created_at": datetime.utcnow().isoformat(),
+        "vector_backend": VECTOR_BACKEND,
+        "embedding_model": EMBEDDING_MODEL,
+        "documents": _document_count(os.path.join(root, DB_NAME)),
+        # BM25 is rebuilt from the vector store's texts, so the lexical index travels with it
+        "lexical_index": "derived",
+        "includes_uploads": os.path.isdir(os.path.join(root, UPLOADS_DIR)),
+        **(extra or {}),
+        "files": _checksums(root),
+    }
+    with open(os.path.join(root, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def create_snapshot(include_uploads: bool = SNAPSHOT_INCLUDE_UPLOADS) -> dict:
+    """
+    Snapshot the registry database and the vector index into SNAPSHOT_DIR/<version>.tar.gz.
+    Ingestion is only paused while the files are copied; compression happens afterwards.
+    """
+    version = _new_version()
+    staging = os.path.join(SNAPSHOT_DIR, f".staging-{version}")
+    os.makedirs(staging)
+    try:
+        t0 = time.perf_counter()
+        with index_lock.exclusive():
+            _backup_sqlite(SQLITE_DB_PATH, os.path.join(staging, DB_NAME))
+            _copy_tree(get_vector_store_path(), os.path.join(staging, VECTORS_DIR))
+        paused_s = round(time.perf_counter() - t0, 3)
+
+        if include_uploads and os.path.isdir(UPLOAD_DIR):
+            # Uploads are content-addressed and written once, so no lock is needed
+            shutil.copytree(
+                UPLOAD_DIR, os.path.join(staging, UPLOADS_DIR),
+                ignore=shutil.ignore_patterns(".upload-*"),
+            )
+
+        manifest = _write_manifest(staging, version, {"ingestion_paused_s": paused_s})
+
+        target = archive_path(version)
+        with tarfile.open(target + ".tmp", "w:gz") as tar:
+            tar.add(staging, arcname=version)
+        os.replace(target + ".tmp", target)
+        print(f"---SNAPSHOT {version}: {manifest['documents']} DOCUMENTS, INGESTION PAUSED {paused_s}s---")
+        return manifest
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+def _read_archive_manifest(path: str) -> Optional[dict]:
+    try:
+        with tarfile.open(path, "r:gz") as tar:
+            for member in tar:
+                if member.isfile() and os.path.basename(member.name) == MANIFEST_NAME and member.name.count("/") == 1:
+                    return json.load(tar.extractfile(member))
+    except (tarfile.TarError, OSError, ValueError):
+        pass
+    return None
+
+def _read_manifest(version: str) -> Optional[dict]:
+    path = os.path.join(_unpacked_path(version), MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    if os.path.exists(archive_path(version)):
+        return _read_archive_manifest(archive_path(version))
+    return None
+
+def ensure_archive(version: str) -> str:
+    """Archive path for a version, packing an unpacked-only snapshot (e.g. previous-*) on demand."""
+    target = archive_path(version)
+    if not os.path.exists(target):
+        source = _unpacked_path(version)
+        if not os.path.isdir(source):
+            raise FileNotFoundError(f"Snapshot not found: {version}")
+        with tarfile.open(target + ".tmp", "w:gz") as tar:
+            tar.add(source, arcname=version)
+        os.replace(target + ".tmp", target)
+    return target
+
+def list_snapshots() -> List[dict]:
+    versions = set()
+    for name in os.listdir(SNAPSHOT_DIR):
+        if name.startswith("."):
+            continue
+        if name.endswith(".tar.gz"):
+            versions.add(name[: -len(".tar.gz")])
+        elif os.path.exists(os.path.join(SNAPSHOT_DIR, name, MANIFEST_NAME)):
+            versions.add(name)
+
+    snapshots = []
+    for version in versions:
+        manifest = _read_manifest(version)
+        if not manifest:
+            continue
+        summary = {k: v for k, v in manifest.items() if k != "files"}
+        summary["archived"] = os.path.exists(archive_path(version))
+        summary["unpacked"] = os.path.isdir(_unpacked_path(version))
+        snapshots.append(summary)
+    return sorted(snapshots, key=lambda s: s.get("created_at", ""), reverse=True)
+
+def _verify(root: str, manifest: dict):
+    for rel, expected in manifest.get("files", {}).items():
+        path = os.path.join(root, rel)
+        if not os.path.exists(path) or _sha256(path) != expected:
+            raise ValueError(f"Snapshot file failed verification: {rel}")
+
+def _extract(archive: str, version: str) -> str:
+    target = _unpacked_path(version)
+    staging = os.path.join(SNAPSHOT_DIR, f".extract-{version}")
+    shutil.rmtree(staging, ignore_errors=True)
+    with tarfile.open(archive, "r:gz") as tar:
+        members = tar.getmembers()
+        for member in members:
+            parts = member.name.split("/")
+            if parts[0] != version or ".." in parts or member.name.startswith("/") or not (member.isfile() or member.isdir()):
+                raise ValueError(f"Unexpected entry in snapshot archive: {member.name}")
+        # The "data" filter is the safe default on Pythons that have it
+        kwargs = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+        tar.extractall(staging, members=members, **kwargs)
+    unpacked = os.path.join(staging, version)
+    with open(os.path.join(unpacked, MANIFEST_NAME)) as f:
+        _verify(unpacked, json.load(f))
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(unpacked, target)
+    shutil.rmtree(staging, ignore_errors=True)
+    return target
+
+def import_snapshot(archive: str) -> dict:
+    """
+    Register an archive produced by create_snapshot on any node: verify its checksums and
+    unpack it next to the others. Nothing is re-parsed or re-embedded.
+    """
+    manifest = _read_archive_manifest(archive)
+    if not manifest:
+        raise ValueError("Not a snapshot archive: manifest.json is missing")
+    version = _check_version(manifest["version"])
+    _extract(archive, version)
+    if os.path.abspath(archive) != os.path.abspath(archive_path(version)):
+        shutil.copyfile(archive, archive_path(version))
+    print(f"---SNAPSHOT {version} IMPORTED ({manifest.get('documents', 0)} DOCUMENTS)---")
+    return manifest
+
+def _swap(source: str, live: str, previous: str):
+    # Renames within one filesystem are atomic; shutil.move falls back to a copy across filesystems
+    if os.path.exists(live):
+        shutil.move(live, previous)
+    elif os.path.isdir(source):
+        os.makedirs(previous)
+    shutil.move(source, live)
+
+def activate_snapshot(version: str, force: bool = False) -> dict:
+    """
+    Make a snapshot the serving index. The live database and vector index are moved to
+    SNAPSHOT_DIR/previous-<timestamp>, which is itself a snapshot, so rolling back is
+    activating that version.
+    """
+    manifest = _read_manifest(version)
+    if not manifest:
+        raise FileNotFoundError(f"Snapshot not found: {version}")
+    if not force:
+        if manifest.get("vector_backend") != VECTOR_BACKEND:
+            raise ValueError(f"Snapshot uses the {manifest.get('vector_backend')} backend, this node serves {VECTOR_BACKEND}")
+        if manifest.get("embedding_model") != EMBEDDING_MODEL:
+            raise ValueError(f"Snapshot was embedded with {manifest.get('embedding_model')}, this node uses {EMBEDDING_MODEL}")
+
+    source = _unpacked_path(version)
+    if not os.path.isdir(source):
+        source = _extract(archive_path(version), version)
+
+    previous_version = f"previous-{_new_version()}"
+    previous = _unpacked_path(previous_version)
+    os.makedirs(previous)
+
+    # Stage copies next to the live paths so the swap itself is a pair of renames
+    vector_path = get_vector_store_path().rstrip("/")
+    incoming_db = f"{SQLITE_DB_PATH}.incoming"
+    incoming_vectors = f"{vector_path}.incoming"
+    for path in (incoming_db, incoming_vectors):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    shutil.copyfile(os.path.join(source, DB_NAME), incoming_db)
+    shutil.copytree(os.path.join(source, VECTORS_DIR), incoming_vectors)
+
+    t0 = time.perf_counter()
+    with index_lock.exclusive():
+        # Release pinned segments while their files are still in place
+        residency_manager.invalidate()
+        _swap(incoming_db, SQLITE_DB_PATH, os.path.join(previous, DB_NAME))
+        _swap(incoming_vectors, vector_path, os.path.join(previous, VECTORS_DIR))
+        engine.dispose()
+        reset_vector_store_clients()
+        clear_result_caches()
+    switched_s = round(time.perf_counter() - t0, 3)
+
+    if manifest.get("includes_uploads"):
+        for name in os.listdir(os.path.join(source, UPLOADS_DIR)):
+            target = os.path.join(UPLOAD_DIR, name)
+            if not os.path.exists(target):
+                shutil.copyfile(os.path.join(source, UPLOADS_DIR, name), target)
+
+    _write_manifest(previous, previous_version, {"replaced_by": version})
+    print(f"---SNAPSHOT {version} ACTIVE (switch took {switched_s}s, rollback: {previous_version})---")
+    return {"version": version, "previous": previous_version, "switch_s": switched_s}
+
+def main():
+    parser = argparse.ArgumentParser(description="Create, move and activate index snapshots.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    create = sub.add_parser("create", help="Snapshot the live index")
+    create.add_argument("--include-uploads", action="store_true", default=SNAPSHOT_INCLUDE_UPLOADS)
+    sub.add_parser("list", help="List known snapshots")
+    export = sub.add_parser("export", help="Copy a snapshot archive to a path")
+    export.add_argument("version")
+    export.add_argument("output")
+    imp = sub.add_parser("import", help="Import a snapshot archive")
+    imp.add_argument("archive")
+    activate = sub.add_parser("activate", help="Serve from a snapshot (run with the server stopped, or use the admin endpoint)")
+    activate.add_argument("version")
+    activate.add_argument("--force", action="store_true", help="Skip backend/embedding model checks")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        result = create_snapshot(include_uploads=args.include_uploads)
+    elif args.command == "list":
+        result = list_snapshots()
+    elif args.command == "export":
+        shutil.copyfile(ensure_archive(args.version), args.output)
+        result = {"version": args.version, "output": args.output}
+    elif args.command == "import":
+        result = import_snapshot(args.archive)
+    else:
+        result = activate_snapshot(args.version, force=args.force)
+    if isinstance(result, dict):
+        result = {k: v for k, v in result.items() if k != "files"}
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
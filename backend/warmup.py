@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from typing import Callable, Dict, Any
+from dotenv import load_dotenv
+from llm_roles import role_models, keep_alive_for
+
+load_dotenv()
+
+# --- CONFIG ---
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "5m")
+VISION_MODEL = os.getenv("VISION_MODEL_NAME", "llama3.2-vision")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL_NAME", "nomic-embed-text")
+
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "True").lower() == "true"
+# Chat models to load into Ollama memory at startup (the embedding model is always loaded); defaults to every role's model
+WARMUP_MODELS = [m.strip() for m in os.getenv("WARMUP_MODELS", ",".join(role_models())).split(",") if m.strip()]
+# Also preload the vision model (image uploads only); best effort, readiness never waits for it
+WARMUP_VISION = os.getenv("WARMUP_VISION", "False").lower() == "true"
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", 600))  # Seconds; loading a large model on CPU is slow
+# Failed steps are retried until they succeed (Ollama may come up after us, a model may still be pulling)
+WARMUP_RETRY_INITIAL_S = float(os.getenv("WARMUP_RETRY_INITIAL_S", 2))
+WARMUP_RETRY_MAX_S = float(os.getenv("WARMUP_RETRY_MAX_S", 60))
+STARTUP_METRICS_PATH = os.getenv("STARTUP_METRICS_PATH", "./data/startup_metrics.jsonl")
+
+# --- READINESS STATE ---
+_state: Dict[str, Any] = {
+    "ready": False,
+    "warming": False,
+    "ready_after_s": None,
+    "steps": {},
+}
+_stop = threading.Event()
+
+def _ollama_post(endpoint: str, payload: dict):
+    request = urllib.request.Request(
+        f"{OLLAMA_BASE_URL}/api/{endpoint}",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=WARMUP_TIMEOUT) as response:
+        response.read()
+
+def preload_chat_model(model: str):
+    # An empty prompt makes Ollama load the model and keep it resident for keep_alive
+    _ollama_post("generate", {"model": model, "prompt": "", "keep_alive": keep_alive_for(model)})
+
+def preload_embedding_model(model: str):
+    _ollama_post("embed", {"model": model, "input": "warm-up", "keep_alive": OLLAMA_KEEP_ALIVE})
+
+def load_graph():
+    # Importing rag_graph pulls in LangChain/LangGraph; compiling it is the rest of the cost
+    import rag_graph
+    rag_graph.get_app_graph()
+
+def open_vector_index():
+    from chroma_utils import get_vector_store
+    # A real query opens the index files and runs one embedding end to end
+    get_vector_store().similarity_search("warm-up", k=1)
+
+def _run_step(name: str, fn: Callable[[], None], required: bool = True) -> bool:
+    attempts = _state["steps"].get(name, {}).get("attempts", 0) + 1
+    t0 = time.perf_counter()
+    try:
+        fn()
+        _state["steps"][name] = {"ok": True, "seconds": round(time.perf_counter() - t0, 3), "attempts": attempts, "required": required}
+        print(f"---WARM-UP {name}: {_state['steps'][name]['seconds']}s---")
+        return True
+    except Exception as e:
+        _state["steps"][name] = {"ok": False, "seconds": round(time.perf_counter() - t0, 3), "attempts": attempts, "required": required, "error": str(e)}
+        print(f"---WARM-UP {name} FAILED (attempt {attempts}): {e}---")
+        return False
+
+def _record_metrics(metrics: dict):
+    try:
+        os.makedirs(os.path.dirname(STARTUP_METRICS_PATH) or ".", exist_ok=True)
+        with open(STARTUP_METRICS_PATH, "a") as f:
+            f.write(json.dumps(metrics) + "\n")
+    except OSError as e:
+        print(f"---COULD NOT RECORD STARTUP METRICS: {e}---")
+
+def run_warm_up(process_start: float, import_seconds: float):
+    """
+    Blocking warm-up. Every step is attempted even if an earlier one fails; failed steps are
+    then retried with exponential backoff until all succeed or the app shuts down.
+    """
+    _state["warming"] = True
+    pending = [
+        ("graph", load_graph),
+        (f"model:{EMBEDDING_MODEL}", lambda: preload_embedding_model(EMBEDDING_MODEL)),
+        ("vector_index", open_vector_index),
+    ] + [(f"model:{model}", lambda model=model: preload_chat_model(model)) for model in WARMUP_MODELS]
+    delay = WARMUP_RETRY_INITIAL_S
+    while True:
+        pending = [(name, fn) for name, fn in pending if not _run_step(name, fn)]
+        if not pending:
+            break
+        print(f"---WARM-UP NOT READY, RETRYING {', '.join(name for name, _ in pending)} IN {delay:g}s---")
+        if _stop.wait(delay):
+            _state["warming"] = False
+            return
+        delay = min(delay * 2, WARMUP_RETRY_MAX_S)
+    if WARMUP_VISION:
+        _run_step(f"model:{VISION_MODEL}", lambda: preload_chat_model(VISION_MODEL), required=False)
+    _state["warming"] = False
+
+    elapsed = round(time.perf_counter() - process_start, 3)
+    _state["ready"] = True
+    _state["ready_after_s"] = elapsed
+    print(f"---READY AFTER {elapsed}s---")
+
+    _record_metrics({
+        "timestamp": datetime.utcnow().isoformat(),
+        "import_s": round(import_seconds, 3),
+        "warm_up_s": elapsed,
+        "ready": _state["ready"],
+        "steps": _state["steps"],
+    })
+
+    from prewarm import PREWARM_ON_STARTUP, prewarm
+    if PREWARM_ON_STARTUP:
+        # Replay frequent questions so the first users after a restart hit warm caches
+        try:
+            prewarm()
+        except Exception as e:
+            print(f"---PREWARM FAILED: {e}---")
+
+async def warm_up(process_start: float, import_seconds: float):
+    await asyncio.to_thread(run_warm_up, process_start, import_seconds)
+
+def stop_warm_up():
+    """Ends the retry loop so shutdown doesn't wait on a backoff sleep."""
+    _stop.set()
+
+def mark_ready():
+    """Used when warm-up is disabled: dependencies load lazily on first request."""
+    _state["ready"] = True
+
+def readiness() -> dict:
+    return dict(_state)
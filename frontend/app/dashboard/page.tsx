@@ -25,6 +25,8 @@ export default function Dashboard() {
     const [productName, setProductName] = useState<string>("");
     const [chatInput, setChatInput] = useState("");
     const [documents, setDocuments] = useState<Document[]>([]);
+    const [documentTotal, setDocumentTotal] = useState(0);
+    const [nextCursor, setNextCursor] = useState<number | null>(null);
     const [toast, setToast] = useState<{ message: string; type: "success" | "error" | "info"; isVisible: boolean }>({
         message: "",
         type: "info",
@@ -45,6 +47,7 @@ export default function Dashboard() {
 
     const fileInputRef = useRef<HTMLInputElement>(null);
     const abortControllerRef = useRef<AbortController | null>(null);
+    const sessionIdRef = useRef<string | null>(null);
     const stepIntervalRef = useRef<NodeJS.Timeout | null>(null);
     const router = useRouter();
     const isAdmin = role === "admin";
@@ -75,13 +78,17 @@ export default function Dashboard() {
         }
     }, [productId, role]);
 
-    const fetchDocuments = async () => {
+    // Without a cursor the list is reloaded from the first page; with one the next page is appended
+    const fetchDocuments = async (after?: number) => {
         if (!productId) return;
         try {
-            const res = await fetch(`${API_URL}/products/${productId}/documents`);
+            const cursor = after !== undefined ? `&after=${after}` : "";
+            const res = await fetch(`${API_URL}/products/${productId}/documents?limit=50${cursor}`);
             if (res.ok) {
                 const data = await res.json();
-                setDocuments(data);
+                setDocuments(prev => (after !== undefined ? [...prev, ...data.items] : data.items));
+                setDocumentTotal(data.total);
+                setNextCursor(data.next_cursor);
             }
         } catch (error) {
             console.error("Failed to fetch documents:", error);
@@ -212,6 +219,23 @@ export default function Dashboard() {
         }
     };
 
+    // Conversation history lives server-side; null means chatting without a session
+    const createSession = async (): Promise<string | null> => {
+        try {
+            const res = await fetch(`${API_URL}/sessions`, {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ product_id: productId }),
+            });
+            if (res.ok) {
+                return (await res.json()).session_id;
+            }
+        } catch (error) {
+            console.error("Failed to create chat session:", error);
+        }
+        return null;
+    };
+
     const handleSendMessage = async () => {
         if (!chatInput.trim()) return;
 
@@ -228,17 +252,31 @@ export default function Dashboard() {
         abortControllerRef.current = new AbortController();
 
         try {
+            // Create the session on first message
+            if (!sessionIdRef.current) {
+                sessionIdRef.current = await createSession();
+            }
+
             // Use streaming endpoint
-            const res = await fetch(`${API_URL}/chat/stream`, {
+            const sendQuestion = () => fetch(`${API_URL}/chat/stream`, {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
                 body: JSON.stringify({
                     question: userMsg,
                     product_id: productId,
-                    image: chatImage // Send base64 image
+                    session_id: sessionIdRef.current,
+                    image: chatImage, // Send base64 image
+                    mode: "fast" // Vector search straight to generation: first token without grading round-trips
                 }),
-                signal: abortControllerRef.current.signal,
+                signal: abortControllerRef.current?.signal,
             });
+            let res = await sendQuestion();
+
+            // Session expired, evicted or lost in a backend restart: start a new one and retry once
+            if (res.status === 404 && sessionIdRef.current) {
+                sessionIdRef.current = await createSession();
+                res = await sendQuestion();
+            }
 
             // Clear image after sending
             setChatImage(null);
@@ -503,7 +541,7 @@ export default function Dashboard() {
 
                         {documents.length > 0 && (
                             <div className="space-y-2">
-                                <h3 className="text-xs uppercase tracking-wider text-cyan-400/70">Uploaded Documents</h3>
+                                <h3 className="text-xs uppercase tracking-wider text-cyan-400/70">Uploaded Documents ({documentTotal})</h3>
                                 {documents.map((doc) => (
                                     <div key={doc.id} className="flex items-center justify-between bg-black/30 border border-cyan-500/20 rounded px-3 py-2">
                                         <span className="text-xs truncate flex-1 text-white/80">{doc.filename}</span>
@@ -516,6 +554,14 @@ export default function Dashboard() {
                                         </button>
                                     </div>
                                 ))}
+                                {nextCursor !== null && (
+                                    <button
+                                        onClick={() => fetchDocuments(nextCursor)}
+                                        className="w-full text-xs text-cyan-400/70 hover:text-cyan-300 border border-cyan-500/20 rounded py-1"
+                                    >
+                                        Load more
+                                    </button>
+                                )}
                             </div>
                         )}
 
@@ -35,11 +35,18 @@ export default function DeviceSelection() {
 
     const fetchProducts = async () => {
         try {
-            const res = await fetch(`${API_URL}/products`);
-            if (res.ok) {
+            // The device grid shows every product: follow the cursor through all pages
+            const all: Product[] = [];
+            let after: number | null = null;
+            do {
+                const cursor: string = after !== null ? `&after=${after}` : "";
+                const res = await fetch(`${API_URL}/products?limit=500${cursor}`);
+                if (!res.ok) return;
                 const data = await res.json();
-                setProducts(data);
-            }
+                all.push(...data.items);
+                after = data.next_cursor;
+            } while (after !== null);
+            setProducts(all);
         } catch (error) {
             console.error("Failed to fetch products:", error);
             setProducts([{ id: 1, name: "G9" }, { id: 2, name: "C3" }]);
@@ -52,6 +59,8 @@ export default function DeviceSelection() {
         if (isEditMode) return;
         sessionStorage.setItem("selectedProductId", product.id.toString());
         sessionStorage.setItem("selectedProductName", product.name);
+        // Load the product's index into memory while the dashboard opens; the response isn't needed
+        fetch(`${API_URL}/products/${product.id}/warm`, { method: "POST", keepalive: true }).catch(() => {});
         router.push("/dashboard");
     };
 